@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+smoke tests of the fetch engine against the local stub of the World Bank API (wbanalysis.stub),
+served with small pages, 503s and 429s so the pagination and the retries are exercised
+"""
+
+import numpy as np
+import pytest
+
+from wbanalysis import config, store
+from wbanalysis.fetch import loadAllCountries
+from wbanalysis.store import loadPanel, refreshPanel
+from wbanalysis.stub import startStub
+
+
+def useStub(monkeypatch, tmp_path, **settings):
+    '''
+    starts a stub with the given settings and points the configuration at it, with a fresh
+    response cache and short retry waits
+    '''
+    server=startStub(port=0, retry_after=0, **settings)
+    monkeypatch.setattr(config, 'BASE_URL', 'http://127.0.0.1:'+str(server.server_port)+'/v2/')
+    monkeypatch.setattr(config, 'CACHE_PATH', str(tmp_path/'cache.sqlite'))
+    monkeypatch.setattr(config, 'BACKOFF_BASE', 0.001)
+    monkeypatch.setattr(config, 'BACKOFF_MAX', 0.01)
+    monkeypatch.setattr(config, 'MAX_RETRIES', 10)
+    return server
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    server=useStub(monkeypatch, tmp_path, max_page_size=50, error_rate=0.1, rate_429=0.1, seed=1)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_modes_agree(stub, monkeypatch):
+    country_codes=list(config.countryMap)
+    failures=[]
+    unbatched=loadAllCountries(country_codes, failures=failures)
+    # the cache would answer the next calls, every mode must get its values from the stub
+    monkeypatch.setattr(config, 'CACHE_ENABLED', False)
+    batched=loadAllCountries(country_codes, batched=True, batch_size=3, failures=failures)
+    monkeypatch.setattr(config, 'STREAM_DECODE_MIN_BYTES', 0)
+    streamed=loadAllCountries(country_codes, batched=True, failures=failures)
+
+    assert failures == []
+    assert unbatched.shape == (len(country_codes), 59, len(config.INDICATOR_CODES))
+    assert 0 < np.isnan(unbatched).mean() < 0.2
+    np.testing.assert_array_equal(unbatched, batched)
+    np.testing.assert_array_equal(unbatched, streamed)
+    assert stub.stats['errors'] > 0 and stub.stats['throttled'] > 0
+
+
+def test_pages_stay_within_max_in_flight(monkeypatch, tmp_path):
+    server=useStub(monkeypatch, tmp_path, max_page_size=20, latency=0.01)
+    failures=[]
+    values=loadAllCountries(list(config.countryMap), max_workers=2, batched=True, failures=failures)
+    server.shutdown()
+    server.server_close()
+
+    assert failures == [] and not np.isnan(values).all()
+    # every query has several pages, fetched concurrently but within the 2 requests in flight
+    assert server.stats['requests'] > 2*len(config.INDICATOR_CODES)
+    assert server.stats['max_in_flight'] <= 2
+
+
+def test_unknown_indicator_fails(monkeypatch, tmp_path):
+    server=useStub(monkeypatch, tmp_path, synthetic=False)
+    monkeypatch.setattr(config, 'INDICATOR_CODES', ['SP.POP.TOTL'])
+    failures=[]
+    values=loadAllCountries(['US', 'IN'], batched=True, failures=failures)
+    server.shutdown()
+    server.server_close()
+
+    assert np.isnan(values).all()
+    assert len(failures) == 1
+    assert failures[0].country == 'US;IN' and failures[0].indicator == 'SP.POP.TOTL'
+    assert 'not valid' in failures[0].message
+
+
+def test_server_errors_fail_after_retries(monkeypatch, tmp_path):
+    server=useStub(monkeypatch, tmp_path, error_rate=1.0)
+    monkeypatch.setattr(config, 'MAX_RETRIES', 2)
+    monkeypatch.setattr(config, 'INDICATOR_CODES', ['SP.POP.TOTL', 'NY.GDP.MKTP.CD'])
+    failures=[]
+    values=loadAllCountries(['US'], failures=failures)
+    server.shutdown()
+    server.server_close()
+
+    assert np.isnan(values).all()
+    assert sorted(failure.indicator for failure in failures) == ['NY.GDP.MKTP.CD', 'SP.POP.TOTL']
+    assert all(failure.status_code == 503 for failure in failures)
+    # the first attempt and 2 retries per indicator
+    assert server.stats['errors'] == 6
+
+
+def test_refresh_matches_full_fetch(stub, monkeypatch):
+    country_codes=list(config.countryMap)
+    monkeypatch.setitem(config.params, 'date', '1960:2010')
+    stored=loadPanel(country_codes[:-1], batched=True)
+    monkeypatch.setitem(config.params, 'date', '1960:2018')
+    # the last country is new and gets its full history
+    refreshed=refreshPanel(stored, country_codes)
+    full=loadPanel(country_codes, batched=True)
+
+    assert refreshed.equals(full)
+    assert refreshed.attrs['lastupdated'] == full.attrs['lastupdated']
+
+
+def test_tail_refresh_keeps_lastupdated(stub, monkeypatch):
+    country_codes=list(config.countryMap)
+    monkeypatch.setitem(config.params, 'date', '1960:2010')
+    stored=loadPanel(country_codes, batched=True)
+    stored.attrs['lastupdated']=dict.fromkeys(config.INDICATOR_CODES, '2020-01-01')
+    monkeypatch.setitem(config.params, 'date', '1960:2018')
+    # only the recent years are downloaded, the date of the stored history stays
+    refreshed=refreshPanel(stored)
+    assert set(refreshed.attrs['lastupdated'].values()) == {'2020-01-01'}
+    # so the revision check still sees the change and downloads the whole history again
+    revised=refreshPanel(refreshed, check_revisions=True)
+    assert set(revised.attrs['lastupdated'].values()) == {'2022-12-01'}
+    assert revised.equals(loadPanel(country_codes, batched=True))
+
+
+def test_failed_revision_keeps_history(stub, monkeypatch):
+    stored=loadPanel(list(config.countryMap), batched=True)
+    monkeypatch.setattr(store, 'getLastUpdated', lambda *args: {'SP.POP.TOTL': '2023-01-01'})
+    monkeypatch.setattr(config, 'MAX_RETRIES', 0)
+    stub.error_rate=1.0
+    failures=[]
+    refreshed=refreshPanel(stored, check_revisions=True, failures=failures)
+
+    # the tails of the other series fail as well
+    assert 'SP.POP.TOTL' in [failure.indicator for failure in failures]
+    assert refreshed.equals(stored)
+    assert refreshed.attrs['lastupdated'] == stored.attrs['lastupdated']
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+World Bank indicators of a few countries: fetch, store, analysis and render stages.
+
+The stages are imported on their own, e.g. ``from wbanalysis.fetch import loadJSONData`` only
+needs numpy and requests; seaborn, matplotlib and IPython are imported when a chart is drawn.
+Importing the package does no work, ``python -m wbanalysis`` runs the whole analysis.
+"""
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+python -m wbanalysis
+"""
+
+from .cli import main
+
+# the render processes started with spawn import this module without running it
+if __name__ == '__main__':
+    main()
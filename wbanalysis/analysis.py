@@ -0,0 +1,930 @@
+# -*- coding: utf-8 -*-
+"""
+analyses of the panel (cleaning, aggregates, cross-sections, time-series features, correlations),
+the charts built from them and the lazy analysis graph deciding what is fetched.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from . import config
+from .fetch import getPageSize, getYearRange, loadJSONData, runFetchTasks
+from .catalog import hasCatalog, findCountries
+from .render import Chart, renderCharts
+from .store import buildPanel, getDatasetVersion, getIndicatorCode, selectColumns
+
+
+def display(obj):
+    '''
+    shows obj with IPython.display when IPython is installed (imported on first use), prints it otherwise
+    '''
+    try:
+        from IPython.display import display as show
+    except ImportError:
+        show=print
+    show(obj)
+
+
+#----------------------------------------------------------------------------------------------------
+# function to invokde the loadJSONData function and form the final DataFrame for each country
+def getCountrywiseDF(country_code, panel=None):
+    '''
+      after json function another function is created which will extract the data for the seven countries
+      by the help pf country codes and will display the dataframes country wise.
+      The rows of the country are read from the panel when it is given, otherwise they are fetched'''
+    
+    print("------------------Loading data for: "+config.countryMap[country_code]+"-----------------------")
+    
+    # for the given country call the loadJSONData function and fetch the data from the API
+    if panel is None:
+        panel=buildPanel([country_code], loadJSONData(country_code)[np.newaxis])
+    
+    # the rows of the country with the "Year" and "Country" columns
+    df=selectColumns(panel, list(panel.columns), [country_code])
+    
+    # display the resulting dataframe
+    display(df.head())
+    
+    # return the formed dataframe for the given country
+    return df
+
+
+#Data cleaning process for the whole panel in one pass
+
+def cleanPanel(panel, how='any', min_coverage=None, interpolate_limit=None, columns=None):
+    '''
+    function for cleaning all the countries of the panel at once instead of one DataFrame per country.
+    The steps are applied in this order: indicators below their coverage threshold are left out,
+    short gaps inside each (country, indicator) series are interpolated, then rows with missing
+    values are dropped. Columns which are not interpolated are not copied.
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel, one row per (country, year) for every country and year.
+    how : str or None, optional
+        'any' drops the rows with a missing value, 'all' the rows without any value,
+        None keeps all the rows.
+    min_coverage : float or dict, optional
+        minimum share of non-missing values (0 to 1) an indicator needs to be kept,
+        either for all indicators or per indicator name.
+    interpolate_limit : int, optional
+        fill gaps between two known values by linear interpolation, at most this many
+        consecutive years per gap. The gaps never reach across two countries.
+    columns : list, optional
+        the indicators to clean, defaults to all the columns of the panel.
+
+    Returns
+    -------
+    cleaned : DataFrame
+        the cleaned panel.
+    '''
+    if how not in ('any', 'all', None):
+        raise ValueError("how must be 'any', 'all' or None")
+    if columns is None:
+        columns=list(panel.columns)
+    
+    # coverage of every indicator over all the countries and years, in one vectorized call
+    if min_coverage is not None:
+        coverage=panel[columns].notna().mean()
+        if not isinstance(min_coverage, dict):
+            min_coverage=dict.fromkeys(columns, min_coverage)
+        columns=[column for column in columns if coverage[column] >= min_coverage.get(column, 0)]
+    
+    data={column: panel[column] for column in columns}
+    
+    # interpolate every series with gaps at once: the columns are laid out as one
+    # (years, countries x indicators) table, so each series is a column of it
+    gaps=[column for column in columns if panel[column].isna().any()]
+    if interpolate_limit is not None and gaps:
+        n_countries=panel.index.get_level_values('country').nunique()
+        n_years=len(panel)//n_countries
+        block=np.stack([panel[column].to_numpy() for column in gaps], axis=1)
+        wide=block.reshape(n_countries, n_years, len(gaps)).transpose(1, 0, 2).reshape(n_years, -1)
+        filled=pd.DataFrame(wide).interpolate(limit=interpolate_limit, limit_area='inside').to_numpy()
+        filled=filled.reshape(n_years, n_countries, len(gaps)).transpose(1, 0, 2).reshape(len(panel), len(gaps))
+        for i, column in enumerate(gaps):
+            data[column]=pd.Series(filled[:, i].astype(panel[column].dtype), index=panel.index, name=column)
+    
+    cleaned=pd.DataFrame(data, index=panel.index, columns=columns, copy=False)
+    if how is not None:
+        cleaned=cleaned.dropna(how=how)
+    return cleaned
+
+#Grouped aggregation of the panel per country
+
+def selectYears(panel, years=None):
+    '''
+    returns the rows of the panel within the (first, last) years window, None meaning no bound
+    '''
+    if years is None:
+        return panel
+    first, last = years
+    year=panel.index.get_level_values('year')
+    mask=np.ones(len(panel), dtype=bool)
+    if first is not None:
+        mask&=np.asarray(year >= first)
+    if last is not None:
+        mask&=np.asarray(year <= last)
+    return panel[mask]
+
+
+def computeCAGR(panel, columns):
+    '''
+    compound annual growth rate of every (country, indicator) series between its first and its
+    last known value: (last/first)**(1/years between them)-1, NaN when it cannot be computed
+    '''
+    data=panel[columns]
+    grouped=data.groupby(level='country', observed=True)
+    # the year of every known value, NaN where the value is missing
+    year=panel.index.get_level_values('year').to_numpy(dtype=float)
+    knownYears=pd.DataFrame(np.where(data.notna().to_numpy(), year[:, np.newaxis], np.nan),
+                            index=data.index, columns=columns).groupby(level='country', observed=True)
+    span=knownYears.max()-knownYears.min()
+    first=grouped.first()
+    last=grouped.last()
+    ratio=(last/first).where((first > 0) & (last > 0) & (span > 0))
+    return ratio**(1/span)-1
+
+
+def aggregatePanel(panel, reducers='mean', columns=None, years=None):
+    '''
+    summarises every indicator per country in one grouped call
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel.
+    reducers : str or list, optional
+        'mean', 'median', 'min', 'max', 'std', 'sum', 'count', 'first', 'last' (first/last known value),
+        'q<percent>' for a quantile, e.g. 'q25', or 'cagr' for the compound annual growth rate.
+    columns : list, optional
+        the indicators to summarise, defaults to all the columns of the panel.
+    years : tuple, optional
+        (first, last) years window, None meaning no bound, defaults to all the years.
+
+    Returns
+    -------
+    summary : DataFrame
+        one row per country; one column per indicator for a single reducer given as a string,
+        otherwise (indicator, reducer) columns.
+    '''
+    if columns is None:
+        columns=list(panel.columns)
+    single=isinstance(reducers, str)
+    if single:
+        reducers=[reducers]
+    
+    window=selectYears(panel, years)
+    grouped=window[columns].groupby(level='country', observed=True)
+    results={}
+    for reducer in reducers:
+        if reducer == 'cagr':
+            results[reducer]=computeCAGR(window, columns)
+        elif reducer.startswith('q'):
+            results[reducer]=grouped.quantile(float(reducer[1:])/100)
+        else:
+            results[reducer]=getattr(grouped, reducer)()
+    
+    if single:
+        return results[reducers[0]]
+    # (indicator, reducer) columns, in the order of columns then reducers
+    summary=pd.concat(results, axis=1).swaplevel(axis=1)
+    return summary[[(column, reducer) for column in columns for reducer in reducers]]
+
+
+#Cross-sections of the panel for some years
+
+def getGrid(panel):
+    '''
+    returns the country code of every block of rows, the first year and the number of years of a
+    panel holding every (country, year) row sorted by country then year.
+    The rows are checked on the first call only, the result is kept in panel.attrs['grid']; the
+    later calls only compare the number of rows and the first and last rows of the first and last
+    blocks with it (pandas copies attrs to the frames derived from the panel).
+
+    Raises
+    ------
+    ValueError
+        if some (country, year) rows are missing, repeated or out of order.
+    '''
+    grid=panel.attrs.get('grid')
+    if grid is not None:
+        blockCountries, first_year, n_years = grid
+        last_year=first_year+n_years-1
+        expected={0: (blockCountries[0], first_year), n_years-1: (blockCountries[0], last_year),
+                  len(panel)-n_years: (blockCountries[-1], first_year), len(panel)-1: (blockCountries[-1], last_year)}
+        if len(panel) == len(blockCountries)*n_years:
+            levels, codes = panel.index.levels, panel.index.codes
+            if all((str(levels[0][codes[0][row]]), int(levels[1][codes[1][row]])) == key for row, key in expected.items()):
+                return blockCountries, first_year, n_years
+    
+    index=panel.index.remove_unused_levels()
+    yearLevel=index.levels[1]
+    n_years=len(yearLevel)
+    if n_years == 0:
+        raise ValueError('the panel has no rows')
+    first_year=int(yearLevel[0])
+    n_countries=len(panel)//n_years
+    # every block of n_years rows is one country holding each year of the range in order
+    countryCodes=np.asarray(index.codes[0])
+    yearCodes=np.asarray(index.codes[1])
+    if (len(panel) != n_countries*n_years or int(yearLevel[-1])-first_year+1 != n_years
+            or not yearLevel.is_monotonic_increasing
+            or not np.array_equal(yearCodes, np.tile(np.arange(n_years), n_countries))
+            or not (countryCodes.reshape(n_countries, n_years) == countryCodes[::n_years, np.newaxis]).all()
+            or len(np.unique(countryCodes[::n_years])) != n_countries):
+        raise ValueError('the panel does not hold every (country, year) row')
+    levelCodes=[str(code) for code in index.levels[0]]
+    blockCountries=[levelCodes[code] for code in countryCodes[::n_years]]
+    panel.attrs['grid']=(blockCountries, first_year, n_years)
+    return blockCountries, first_year, n_years
+
+
+def crossSection(panel, column, years, country_codes=None):
+    '''
+    returns one indicator for some years as a wide country x year table.
+    The panel holds every (country, year) row sorted by country then year, so the row of
+    (country, year) is block*number_of_years+(year-first_year) and the values are gathered
+    directly, in a time proportional to the size of the result once getGrid has checked the panel.
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel, with all its (country, year) rows (e.g. not after cleanPanel dropped some).
+    column : str
+        the indicator, e.g. 'Total Population'.
+    years : list
+        the years wanted, e.g. [2000, 2010].
+    country_codes : list, optional
+        the countries wanted, in this order, defaults to all the countries of the panel.
+
+    Returns
+    -------
+    wide : DataFrame
+        one row per country code and one column per year.
+    '''
+    blockCountries, first_year, n_years = getGrid(panel)
+    if country_codes is None:
+        country_codes=blockCountries
+    block={country_code: i for i, country_code in enumerate(blockCountries)}
+    
+    offsets=np.asarray(years, dtype=int)-first_year
+    if offsets.size and (offsets.min() < 0 or offsets.max() >= n_years):
+        raise KeyError('years outside of the panel: '+str(list(years)))
+    rows=np.array([block[country_code] for country_code in country_codes], dtype=int)*n_years
+    
+    values=panel[column].to_numpy()
+    return pd.DataFrame(values[rows[:, np.newaxis]+offsets[np.newaxis, :]],
+                        index=pd.Index(country_codes, name='country'), columns=pd.Index(list(years), name='year'))
+
+
+#Time-series features of every series of the panel
+
+def getBlock(panel, columns):
+    '''
+    returns the columns of the panel as a float64 block of shape (countries, years, indicators)
+    '''
+    blockCountries, first_year, n_years = getGrid(panel)
+    values=panel[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    return values.reshape(len(blockCountries), n_years, len(columns))
+
+
+def growthRate(block):
+    '''
+    year-over-year growth of every series of the block, NaN for the first year
+    '''
+    growth=np.full(block.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth[:, 1:]=block[:, 1:]/block[:, :-1]-1
+    # no growth from a zero value
+    growth[~np.isfinite(growth)]=np.nan
+    return growth
+
+
+def yearlyChange(block):
+    '''
+    difference with the previous year of every series of the block, NaN for the first year
+    '''
+    change=np.full(block.shape, np.nan)
+    change[:, 1:]=block[:, 1:]-block[:, :-1]
+    return change
+
+
+def rollingStats(block, window):
+    '''
+    mean and standard deviation of every series of the block over the last window years,
+    NaN until window years are known (like pandas rolling)
+    '''
+    mean=np.full(block.shape, np.nan)
+    std=np.full(block.shape, np.nan)
+    if window > block.shape[1]:
+        return mean, std
+    # strided view of shape (countries, years-window+1, indicators, window), no copy of the block
+    windows=np.lib.stride_tricks.sliding_window_view(block, window, axis=1)
+    mean[:, window-1:]=windows.mean(axis=-1)
+    if window > 1:
+        std[:, window-1:]=windows.std(axis=-1, ddof=1)
+    return mean, std
+
+
+def computeFeatures(panel, columns=None, window=3, per_capita=None, population='Total Population'):
+    '''
+    computes the time-series features of every (country, indicator) series in one batched pass
+    over the (countries, years, indicators) block of the panel
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel, with all its (country, year) rows.
+    columns : list, optional
+        the indicators, defaults to all the columns of the panel.
+    window : int, optional
+        number of years of the rolling mean and standard deviation. The default is 3.
+    per_capita : list, optional
+        indicators also divided by the population, e.g. ['GDP in USD'].
+    population : str, optional
+        the column holding the population. The default is 'Total Population'.
+
+    Returns
+    -------
+    features : DataFrame
+        same index as the panel, with for every indicator the columns '<indicator> growth',
+        '<indicator> change', '<indicator> mean(<window>)' and '<indicator> std(<window>)',
+        and '<indicator> per capita' for the per_capita indicators.
+    '''
+    if columns is None:
+        columns=list(panel.columns)
+    block=getBlock(panel, columns)
+    mean, std = rollingStats(block, window)
+    features={'growth': growthRate(block), 'change': yearlyChange(block),
+              'mean('+str(window)+')': mean, 'std('+str(window)+')': std}
+    
+    n_rows=block.shape[0]*block.shape[1]
+    data={}
+    for j, column in enumerate(columns):
+        for name, values in features.items():
+            data[column+' '+name]=values[:, :, j].reshape(n_rows)
+    if per_capita:
+        people=panel[population].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for column in per_capita:
+                data[column+' per capita']=panel[column].to_numpy(dtype=np.float64, na_value=np.nan)/people
+    return pd.DataFrame(data, index=panel.index)
+
+
+def cagrBetween(panel, first_year, last_year, columns=None):
+    '''
+    compound annual growth rate of every (country, indicator) series between two given years,
+    NaN when a value is missing or not positive
+
+    Returns
+    -------
+    cagr : DataFrame
+        one row per country and one column per indicator.
+    '''
+    if columns is None:
+        columns=list(panel.columns)
+    if last_year <= first_year:
+        raise ValueError('last_year must come after first_year')
+    blockCountries, panel_first_year, n_years = getGrid(panel)
+    if first_year < panel_first_year or last_year >= panel_first_year+n_years:
+        raise KeyError('years outside of the panel: '+str([first_year, last_year]))
+    block=getBlock(panel, columns)
+    first=block[:, first_year-panel_first_year]
+    last=block[:, last_year-panel_first_year]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr=np.where((first > 0) & (last > 0), (last/first)**(1/(last_year-first_year))-1, np.nan)
+    return pd.DataFrame(cagr, index=pd.Index(blockCountries, name='country'), columns=columns)
+
+
+#Correlation of the indicators
+# pairwise-complete Pearson correlations from running sums, so the rows can be streamed in chunks
+# and a pair of indicators only uses the rows where both are known (like DataFrame.corr)
+
+# correlation matrices already computed, by (dataset version, mode, columns, min_periods)
+_correlationCache={}
+
+
+def correlationSums(values, shift):
+    '''
+    running sums of a chunk of rows of shape (rows, indicators) needed by pairwiseCorrelation;
+    entry [i, j] of every sum only counts the rows where both indicator i and j are known.
+    The values are shifted (by a typical value of every indicator) to limit the cancellation.
+    '''
+    known=~np.isnan(values)
+    x=np.where(known, values-shift, 0.0)
+    mask=known.astype(np.float64)
+    return np.stack([mask.T@mask, x.T@mask, (x*x).T@mask, x.T@x])
+
+
+def pairwiseCorrelation(sums, min_periods=1):
+    '''
+    correlation matrix from the running sums of correlationSums, NaN for the pairs with less than
+    max(min_periods, 2) common rows or a constant series
+    '''
+    n, sx, sxx, sxy = sums
+    sy, syy = sx.T, sxx.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov=sxy-sx*sy/n
+        var_x=sxx-sx*sx/n
+        var_y=syy-sy*sy/n
+        corr=cov/np.sqrt(var_x*var_y)
+    corr[(n < max(min_periods, 2)) | ~(var_x > 0) | ~(var_y > 0)]=np.nan
+    return np.clip(corr, -1, 1)
+
+
+def correlationMatrix(panel, columns=None, mode='pooled', chunk_rows=100000, min_periods=1, cache=True):
+    '''
+    correlations of the numeric indicators of the panel, streamed over chunks of rows
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel (the index is not correlated, only the indicator columns).
+    columns : list, optional
+        the indicators, defaults to all the numeric columns of the panel.
+    mode : str, optional
+        'pooled' for one matrix over the rows of all the countries, 'country' for one matrix per
+        country. The default is 'pooled'.
+    chunk_rows : int, optional
+        number of rows converted to float64 at a time. The default is 100000.
+    min_periods : int, optional
+        minimum number of rows where both indicators are known. The default is 1.
+    cache : bool, optional
+        reuse the matrix computed for the same data and arguments. The default is True.
+
+    Returns
+    -------
+    corr : DataFrame
+        indicator x indicator matrix for 'pooled', (country, indicator) x indicator for 'country'.
+    '''
+    if mode not in ('pooled', 'country'):
+        raise ValueError("mode must be 'pooled' or 'country', not "+repr(mode))
+    if columns is None:
+        columns=[column for column in panel.columns if pd.api.types.is_numeric_dtype(panel[column])]
+    
+    key=None
+    if cache:
+        key=(getDatasetVersion(panel[columns]), mode, tuple(columns), min_periods)
+        if key in _correlationCache:
+            return _correlationCache[key].copy()
+    
+    if mode == 'pooled':
+        shift=None
+        sums=0
+        for start in range(0, len(panel), chunk_rows):
+            values=panel[columns].iloc[start:start+chunk_rows].to_numpy(dtype=np.float64, na_value=np.nan)
+            if shift is None:
+                # a typical value of every indicator, taken from the first chunk
+                with np.errstate(invalid='ignore'):
+                    shift=np.nan_to_num(np.nanmedian(values, axis=0)) if len(values) else 0.0
+            sums=sums+correlationSums(values, shift)
+        if shift is None:
+            sums=np.zeros((4, len(columns), len(columns)))
+        corr=pd.DataFrame(pairwiseCorrelation(sums, min_periods), index=columns, columns=columns)
+    else:
+        # the rows of a country are few (one per year), each country is one chunk
+        matrices={}
+        for country_code, rows in panel[columns].groupby(level='country', observed=True, sort=False):
+            values=rows.to_numpy(dtype=np.float64, na_value=np.nan)
+            with np.errstate(invalid='ignore'):
+                shift=np.nan_to_num(np.nanmedian(values, axis=0))
+            matrices[str(country_code)]=pd.DataFrame(pairwiseCorrelation(correlationSums(values, shift), min_periods),
+                                                     index=columns, columns=columns)
+        corr=pd.concat(matrices, names=['country', None])
+    
+    if key is not None:
+        _correlationCache[key]=corr.copy()
+    return corr
+
+
+#Rollups of the countries into regions, income groups or custom groups
+# computed from the panel with weighted sums over the (countries, years, indicators) block,
+# instead of requesting the aggregate codes of the API
+
+def getGroups(by, country_codes):
+    '''
+    returns the {group: [country codes]} of the countries
+
+    Parameters
+    ----------
+    by : str or dict
+        'region' or 'income' (read from the catalog), or a dict {group: [country codes]}.
+    country_codes : list
+        the country codes (ISO2) of the panel.
+    '''
+    if isinstance(by, dict):
+        return {group: [code for code in codes if code in country_codes] for group, codes in by.items()}
+    if by not in ('region', 'income'):
+        raise ValueError("by must be 'region', 'income' or a dict of groups, not "+repr(by))
+    if not hasCatalog():
+        raise RuntimeError('the catalog is needed to group the countries by '+by+', run: python -m wbanalysis catalog')
+    groups={}
+    for country in findCountries():
+        if country.iso2 in country_codes and getattr(country, by):
+            groups.setdefault(getattr(country, by), []).append(country.iso2)
+    return dict(sorted(groups.items()))
+
+
+def rollupPanel(panel, by='region', weights='Total Population', columns=None):
+    '''
+    aggregates the countries of the panel into groups, every year. The indicators of
+    config.SUM_INDICATORS are summed, the others are averaged weighted by the weights column
+    (e.g. 'Total Population' or 'GDP in USD'); a country only counts for the years where both its
+    value and its weight are known.
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel, with all its (country, year) rows.
+    by : str or dict, optional
+        'region', 'income' or a dict {group: [country codes]}. The default is 'region'.
+    weights : str, optional
+        the column of the weights, None for plain means. The default is 'Total Population'.
+    columns : list, optional
+        the indicators, defaults to all the columns of the panel.
+
+    Returns
+    -------
+    rollup : DataFrame
+        indexed by (group, year), one column per indicator.
+    '''
+    if columns is None:
+        columns=list(panel.columns)
+    blockCountries, first_year, n_years = getGrid(panel)
+    groups=getGroups(by, blockCountries)
+    
+    # membership matrix (groups, countries)
+    position={code: i for i, code in enumerate(blockCountries)}
+    member=np.zeros((len(groups), len(blockCountries)))
+    for g, codes in enumerate(groups.values()):
+        member[g, [position[code] for code in codes]]=1
+    
+    block=getBlock(panel, columns)
+    known=~np.isnan(block)
+    values=np.where(known, block, 0.0)
+    summed=np.array([getIndicatorCode(column) in config.SUM_INDICATORS for column in columns])
+    if weights is None:
+        weight=np.ones(block.shape[:2])
+    elif weights not in panel:
+        raise ValueError("the weights column '"+weights+"' is not in the panel")
+    else:
+        weight=getBlock(panel, [weights])[:, :, 0]
+    # a missing weight leaves the country out of the weighted means
+    weighted=np.where(np.isnan(weight), 0.0, weight)[:, :, np.newaxis]*known
+    
+    totals=np.einsum('gc,cyi->gyi', member, values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means=np.einsum('gc,cyi->gyi', member, weighted*values)/np.einsum('gc,cyi->gyi', member, weighted)
+    rollup=np.where(summed, totals, means)
+    # no known value at all in the group that year
+    rollup[np.einsum('gc,cyi->gyi', member, known.astype(np.float64)) == 0]=np.nan
+    
+    index=pd.MultiIndex.from_product([list(groups), np.arange(first_year, first_year+n_years)], names=['group', 'year'])
+    return pd.DataFrame(rollup.reshape(len(groups)*n_years, len(columns)), index=index, columns=columns)
+
+
+def form_in_cn_df(panel):
+    '''
+     function to extract specific columns from the panel for India and China
+    Returns
+    -------
+    in_cn_df : DataFrame
+        total population and electric power consumption of India followed by China.
+    '''
+    return selectColumns(panel, ['Total Population', 'Electric Power Consumption(kWH per capita)'], ['IN', 'CN'])
+
+
+def keepCountries(panel, country_codes):
+    '''
+    returns the codes of country_codes which are in the panel, in the same order
+    (the charts comparing a fixed list of countries draw the ones which were fetched)
+    '''
+    present=set(str(code) for code in panel.index.get_level_values('country').unique())
+    return [code for code in country_codes if code in present]
+
+
+#----------------------------------------------------------------------------------------------------
+#statistical analysis.........
+# every chart is a function of the panel returning a declarative Chart (see render); ANALYSES (at the
+# end of this module) declares the countries, indicators and years each of them reads, so only the
+# data of the requested charts is fetched.
+
+#Heatmap to analyse the correlation between the variables taken
+def buildCorrelationChart(panel):
+    '''
+    correlation matrix of all the indicators of all the countries
+    '''
+    # only the numeric indicators, Country and Year are the index of the panel
+    corr = correlationMatrix(panel)
+    return Chart('heatmap', corr, 'correlation_us.png', 'correlation matrix of the indicators', (10, 10), None,
+                 {'cmap': 'RdBu', 'center': 0})
+
+
+#lineplot to see the electric power cnsumption of canada as canada is the country of my dataframe with least population
+def buildCanadaPowerChart(panel):
+    '''
+    electric power consumption of Canada against its population
+    '''
+    # read the columns from the panel for Canada
+    df=selectColumns(panel, ['Electric Power Consumption(kWH per capita)','Total Population'], ['CA'])
+    
+    print("First few records of the data: ")
+    display(df.head())
+    
+    # line plot
+    return Chart('line', df, 'Electric power usage canada.png', 'Total electric power consumption of Canada', (6, 5),
+                 plot={'x': 'Total Population', 'y': 'Electric Power Consumption(kWH per capita)', 'linewidth': 2.5},
+                 layout={'plain_ticks': True, 'rotation': 60})
+
+
+#Electric power consumption of India and China
+def buildIndiaChinaPowerChart(panel):
+    '''
+    scatter plot of the electric power consumption of India and China against their population
+    '''
+    # get the desired data
+    in_cn_df=form_in_cn_df(panel)
+    print("Few records from the selected features: ")
+    display(in_cn_df.head())
+    # scatter plot
+    return Chart('scatter', in_cn_df, 'india china E.power usage graph.png', 'Electric consumption:India V/S China',
+                 plot={'x': 'Total Population', 'y': 'Electric Power Consumption(kWH per capita)', 'hue': 'Country',
+                       'palette': 'bright'},
+                 layout={'plain_ticks': True, 'rotation': 60, 'invert_y': True})
+
+
+#comparison of the average birth and death rate of all the seven countries
+def buildBirthDeathRatesChart(panel):
+    '''
+    bar plot of the average birth and death rate of each country
+    '''
+    # average birth and death rate of every country in one grouped call
+    df1 = aggregatePanel(panel, 'mean', ['Birth Rate', 'Death Rate']).round(2)
+    df1 = df1.rename(columns={'Birth Rate': 'birthrates', 'Death Rate': 'deathrates'})
+    df1['countries'] = [config.countryMap[str(code)] for code in df1.index]
+    df1 = df1.reset_index(drop=True)
+    print(df1)
+    
+    #plotting a group barplot to view the average birth and death rate of each of the countries selected
+    return Chart('bar', df1, 'avg birth and deathrates.png', 'Average birthrate and deathrate of the countries',
+                 plot={'x': 'countries', 'y': ['birthrates', 'deathrates']})
+
+
+#extracting Great Britain data from the complete dataframe to show the Energy consumption of the Great Britain
+def buildGBEnergyChart(panel):
+    '''
+    line plot of the energy consumption indicators of Great Britain
+    '''
+    #extracting Great Britain data from the complete dataframe to show the Energy consumption of the Great Britain upto 2010
+    #(all the years but the four most recent ones)
+    GB_df=panel.loc['GB'].iloc[:-4]
+    return Chart('lines', GB_df, 'GB energy consumption.png', "Energy Consumption in Great Britian\n", (6.4, 4.8), None,
+                 {'y': ['Electric Power Consumption(kWH per capita)', 'Renewable Energy Consumption (%)',
+                        'Fossil Fuel Consumption (%)'], 'fmt': '.-'},
+                 {'legend': ['Electric Power Consumption(kWH per capita)', 'Renewable Energy Consumption(%)',
+                             'Fossil Fuel Consumption(%)'],
+                  'xlabel': 'Year', 'ylabel': 'Energy Consumption', 'rotation': 60})
+
+
+#the same energy chart for every country, saved in the 'energy report' directory
+def buildEnergyReportCharts(panel):
+    '''
+    line plots of the energy consumption indicators of every country of the panel
+
+    Returns
+    -------
+    charts : list
+        one Chart per country, all sharing the same template.
+    '''
+    columns=['Electric Power Consumption(kWH per capita)', 'Renewable Energy Consumption (%)', 'Fossil Fuel Consumption (%)']
+    charts=[]
+    for country_code in getGrid(panel)[0]:
+        country=config.countryMap.get(country_code, country_code)
+        charts.append(Chart('lines', panel.loc[country_code, columns], os.path.join('energy report', country+'.png'),
+                            'Energy Consumption in '+country+'\n', (6.4, 4.8), None, {'y': columns, 'fmt': '.-'},
+                            {'legend': ['Electric Power Consumption(kWH per capita)', 'Renewable Energy Consumption(%)',
+                                        'Fossil Fuel Consumption(%)'],
+                             'xlabel': 'Year', 'ylabel': 'Energy Consumption', 'rotation': 60}))
+    return charts
+
+
+#total population of all countries in 2000 and 2010
+def buildPopulationChart(panel):
+    '''
+    bar plot of the total population of each country in 2000 and 2010
+    '''
+    #total population of all countries in 2000 and 2010, read directly from the panel
+    country_codes=keepCountries(panel, ['IN','CN','US','GB','CA','ZA','JP'])
+    wide = crossSection(panel, 'Total Population', [2000, 2010], country_codes)
+    
+    df_merged = pd.DataFrame({'T.pop in 2000': wide[2000].to_numpy(),
+                              'Country': [config.countryMap[code] for code in country_codes],
+                              'T.pop in 2010': wide[2010].to_numpy()})
+    print('Result:\n', df_merged)
+    
+    #after finding total population for the years 2000 and 2010 now we will visualise
+    # it graphically to see the difference of the population in 10 years
+    return Chart('bar', df_merged, 'total population comparison.png', 'Population comparison in 2000 and 2010',
+                 plot={'x': 'Country', 'y': ['T.pop in 2000', 'T.pop in 2010'], 'color': ['red', 'green']})
+
+
+#extracting the gdp for last 10 years
+def buildGDPChart(panel):
+    '''
+    line plot of the GDP of each country since 2008
+    '''
+    #extracting the GDP of all countries from the panel
+    df6g = selectColumns(panel, ['GDP in USD'], keepCountries(panel, ['IN','CN','US','GB','CA','ZA','JP']))
+    df6g = df6g[df6g.Year >= 2008]
+    
+    # plot using seaborn library
+    return Chart('line', df6g, 'gdp comparison.png', 'GDP in USD',
+                 plot={'x': 'Year', 'y': 'GDP in USD', 'hue': 'Country', 'style': 'Country', 'palette': 'Set2',
+                       'markers': True, 'dashes': False, 'linewidth': 2.5})
+
+
+#agricultural and industrial employment comparison
+def buildEmploymentChart(panel):
+    '''
+    bar plot of the employment in industry and agriculture of each country in 2012
+    '''
+    #extract the employment columns of all countries from the panel
+    df6ae = selectColumns(panel, ['Employment in Industry(%)', 'Employment in Agriculture(%)'], keepCountries(panel, ['IN','CN','US','GB','CA','ZA','JP']))
+    df6ae = df6ae[df6ae.Year == 2012]
+    
+    # bar plot
+    return Chart('bar', df6ae, 'empolyment comparison.png', 'employment in Industries v/s Agriculture in 2012',
+                 plot={'x': 'Country', 'y': ['Employment in Industry(%)', 'Employment in Agriculture(%)'],
+                       'color': ['purple', 'pink']})
+
+
+#----------------------------------------------------------------------------------------------------
+# lazy analysis graph
+# the charts to produce decide what is fetched: the declarations of ANALYSES are merged into a
+# plan of (countries, years) per indicator, and only that plan is requested from the API
+
+def getWindow(name):
+    '''
+    returns the (first, last) years an analysis reads, clamped to params['date'],
+    None when none of its years is requested
+    '''
+    first_year, last_year = getYearRange()
+    first, last = ANALYSES[name]['years'] or (None, None)
+    first=first_year if first is None else max(first, first_year)
+    last=last_year if last is None else min(last, last_year)
+    if first > last:
+        return None
+    return first, last
+
+
+def planFetch(names):
+    '''
+    merges the declarations of the requested analyses into the minimal fetch plan; the analyses
+    whose years are all outside params['date'] add nothing to it
+
+    Parameters
+    ----------
+    names : list
+        keys of ANALYSES, e.g. ['gdp'].
+
+    Returns
+    -------
+    plan : dict
+        indicator code -> (country codes, first year, last year), in the order of INDICATOR_CODES.
+    '''
+    plan={}
+    for name in names:
+        analysis=ANALYSES[name]
+        # None stands for all the countries, all the indicators or all the years
+        countries=[code for code in analysis['countries'] or config.countryMap if code in config.countryMap]
+        window=getWindow(name)
+        if not countries or window is None:
+            continue
+        for indicator in analysis['indicators'] or config.INDICATOR_CODES:
+            # merge with the earlier analyses reading this indicator, without changing countries and window
+            merged, first, last = plan.get(indicator, ([], window[0], window[1]))
+            merged=merged+[code for code in countries if code not in merged]
+            plan[indicator]=(merged, min(first, window[0]), max(last, window[1]))
+    return {indicator: plan[indicator] for indicator in config.INDICATOR_CODES if indicator in plan}
+
+
+def isFullPlan(plan):
+    '''
+    tells whether the plan covers every country, indicator and year of the configuration
+    '''
+    return len(plan) == len(config.INDICATOR_CODES) and all(
+        set(countries) >= set(config.countryMap) and (first, last) == getYearRange()
+        for countries, first, last in plan.values())
+
+
+def loadPlan(plan, max_workers=None, per_host_limit=None, batched=False, batch_size=None, failures=None):
+    '''
+    fetches the plan returned by planFetch into a panel holding only the planned indicators,
+    countries and years; the other cells of the panel are NaN. The other parameters are the
+    ones of loadAllCountries.
+    '''
+    if batch_size is None:
+        batch_size=config.MAX_BATCH_COUNTRIES
+    if not batched:
+        batch_size=1
+    
+    country_codes=[]
+    for countries, first, last in plan.values():
+        country_codes+=[code for code in countries if code not in country_codes]
+    first_year=min(first for countries, first, last in plan.values())
+    last_year=max(last for countries, first, last in plan.values())
+    years=np.arange(first_year, last_year+1)
+    
+    values=np.full((len(country_codes), len(years), len(plan)), np.nan)
+    tasks=[]
+    for j, (indicator, (countries, first, last)) in enumerate(plan.items()):
+        for k in range(0, len(countries), batch_size):
+            batch=countries[k:k+batch_size]
+            tasks.append((batch, indicator, (first, last),
+                          {code: values[country_codes.index(code), first-first_year:last-first_year+1, j] for code in batch}))
+    
+    lastUpdated={}
+    runFetchTasks(tasks, max_workers, per_host_limit, failures, lastUpdated)
+    panel=buildPanel(country_codes, values, years, [config.featureMap[indicator] for indicator in plan])
+    panel.attrs['lastupdated']=lastUpdated
+    return panel
+
+
+def countRequests(plan, batched=False, batch_size=None):
+    '''
+    number of API requests loadPlan sends for every indicator of the plan (without the cache),
+    from the batches of countries and the pages of each query
+
+    Returns
+    -------
+    counts : dict
+        indicator code -> number of requests.
+    '''
+    if batch_size is None:
+        batch_size=config.MAX_BATCH_COUNTRIES
+    if not batched:
+        batch_size=1
+    counts={}
+    for indicator, (countries, first, last) in plan.items():
+        counts[indicator]=0
+        for k in range(0, len(countries), batch_size):
+            rows=len(countries[k:k+batch_size])*(last-first+1)
+            counts[indicator]+=-(-rows//getPageSize(rows))
+    return counts
+
+
+def runAnalyses(names, panel, max_workers=None):
+    '''
+    runs the requested analyses on a panel holding at least their planned data: the charts are
+    built in order, then rendered together by renderCharts
+
+    Returns
+    -------
+    paths : list
+        the files written, in the order of names.
+    '''
+    charts=[]
+    for name in names:
+        countries=ANALYSES[name]['countries'] or []
+        loaded=keepCountries(panel, countries)
+        missing=[code for code in countries if code not in loaded]
+        missing+=[config.featureMap[indicator] for indicator in ANALYSES[name]['indicators'] or []
+                  if config.featureMap[indicator] not in panel]
+        if missing:
+            print("Skipping the chart '"+name+"', its data was not loaded: "+', '.join(missing))
+            continue
+        if getWindow(name) is None:
+            print("Skipping the chart '"+name+"', none of its years is within "+str(config.params['date']))
+            continue
+        # a chart function returns one Chart, or a list of them for the per-country reports
+        chart=ANALYSES[name]['chart'](panel)
+        charts.extend(chart if isinstance(chart, list) else [chart])
+    return renderCharts(charts, max_workers)
+
+
+# the analyses of the script: the countries, indicators and (first, last) years each chart reads
+# (None for all of them) and the function building its Chart
+ANALYSES={
+    'correlation': {'countries': None, 'indicators': None, 'years': None, 'chart': buildCorrelationChart},
+    'canada power': {'countries': ['CA'], 'indicators': ['EG.USE.ELEC.KH.PC', 'SP.POP.TOTL'], 'years': None,
+                     'chart': buildCanadaPowerChart},
+    'india china power': {'countries': ['IN', 'CN'], 'indicators': ['SP.POP.TOTL', 'EG.USE.ELEC.KH.PC'], 'years': None,
+                          'chart': buildIndiaChinaPowerChart},
+    'birth death rates': {'countries': None, 'indicators': ['SP.DYN.CBRT.IN', 'SP.DYN.CDRT.IN'], 'years': None,
+                          'chart': buildBirthDeathRatesChart},
+    'gb energy': {'countries': ['GB'], 'indicators': ['EG.USE.ELEC.KH.PC', 'EG.FEC.RNEW.ZS', 'EG.USE.COMM.FO.ZS'],
+                  'years': None, 'chart': buildGBEnergyChart},
+    'population': {'countries': None, 'indicators': ['SP.POP.TOTL'], 'years': (2000, 2010), 'chart': buildPopulationChart},
+    'gdp': {'countries': None, 'indicators': ['NY.GDP.MKTP.CD'], 'years': (2008, None), 'chart': buildGDPChart},
+    'employment': {'countries': None, 'indicators': ['SL.IND.EMPL.ZS', 'SL.AGR.EMPL.ZS'], 'years': (2012, 2012),
+                   'chart': buildEmploymentChart},
+    # one energy chart per country (not drawn by default)
+    'energy report': {'countries': None, 'indicators': ['EG.USE.ELEC.KH.PC', 'EG.FEC.RNEW.ZS', 'EG.USE.COMM.FO.ZS'],
+                      'years': None, 'chart': buildEnergyReportCharts},
+    }
+# the charts produced by the script, only the data they need is fetched
+OUTPUTS=['correlation', 'canada power', 'india china power', 'birth death rates', 'gb energy', 'population', 'gdp',
+         'employment']
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+catalog of the World Bank countries and indicators: their metadata is downloaded once into a
+local SQLite file and looked up by code, name prefix, region, income group and topic, so the
+fetches can be driven over any economy or indicator without editing countryMap and featureMap.
+
+The names are searched with an FTS5 index when SQLite has it, with LIKE otherwise.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from . import config
+from .fetch import fetchAllPages
+
+# a country (or an aggregate such as a region) of the catalog
+Country=namedtuple('Country', ['code', 'iso2', 'name', 'region', 'income', 'lending', 'capital', 'aggregate'])
+# an indicator of the catalog, topics is the list of its topic names
+Indicator=namedtuple('Indicator', ['code', 'name', 'source', 'unit', 'topics'])
+
+_catalogLocal=threading.local()
+
+
+def hasFTS5(conn):
+    '''
+    tells whether the SQLite library was built with the FTS5 full text search
+    '''
+    try:
+        conn.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(text)')
+        conn.execute('DROP TABLE temp.fts5_probe')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def getCatalogConnection():
+    '''
+    returns the SQLite connection of the current thread to the catalog, creating the tables on first use
+    '''
+    conn=getattr(_catalogLocal, 'conn', None)
+    if conn is None or getattr(_catalogLocal, 'path', None) != config.CATALOG_PATH:
+        conn=sqlite3.connect(config.CATALOG_PATH, timeout=30)
+        conn.executescript('''CREATE TABLE IF NOT EXISTS countries (
+                                  code TEXT PRIMARY KEY,
+                                  iso2 TEXT,
+                                  name TEXT,
+                                  region TEXT,
+                                  income TEXT,
+                                  lending TEXT,
+                                  capital TEXT,
+                                  aggregate INTEGER);
+                              CREATE INDEX IF NOT EXISTS countries_iso2 ON countries (iso2);
+                              CREATE INDEX IF NOT EXISTS countries_region ON countries (region);
+                              CREATE INDEX IF NOT EXISTS countries_income ON countries (income);
+                              CREATE TABLE IF NOT EXISTS indicators (
+                                  code TEXT PRIMARY KEY,
+                                  name TEXT,
+                                  source TEXT,
+                                  unit TEXT,
+                                  topics TEXT);
+                              CREATE TABLE IF NOT EXISTS indicator_topics (
+                                  topic TEXT,
+                                  code TEXT,
+                                  PRIMARY KEY (topic, code));''')
+        # names are compared without case by the LIKE fallback, these indexes serve the prefix searches
+        conn.execute('CREATE INDEX IF NOT EXISTS countries_name ON countries (name COLLATE NOCASE)')
+        conn.execute('CREATE INDEX IF NOT EXISTS indicators_name ON indicators (name COLLATE NOCASE)')
+        fts=hasFTS5(conn)
+        if fts:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS countries_fts USING fts5(name, content='countries', content_rowid='rowid')")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS indicators_fts USING fts5(name, content='indicators', content_rowid='rowid')")
+        conn.commit()
+        _catalogLocal.conn=conn
+        _catalogLocal.path=config.CATALOG_PATH
+        _catalogLocal.fts=fts
+    return conn
+
+
+def downloadRows(endpoint, per_host_limit=None):
+    '''
+    downloads every row of a metadata endpoint of the API, e.g. 'countries'
+
+    Raises
+    ------
+    RuntimeError
+        if a page could not be fetched.
+    '''
+    if per_host_limit is None:
+        per_host_limit=config.PER_HOST_LIMIT
+    # the number of rows is unknown, ask for the largest pages and follow the "pages" field
+    pages=fetchAllPages(config.BASE_URL+endpoint, {'format': 'json'}, config.MAX_PAGE_SIZE, per_host_limit)
+    rows=[]
+    for page in pages:
+        if page.error is not None:
+            raise RuntimeError('could not download '+endpoint+': '+str(page.error))
+        rows.extend(page.rows)
+    return rows
+
+
+def getLabel(item):
+    '''
+    returns the "value" of an {"id": ..., "value": ...} field of the API, None when it is empty
+    '''
+    if not item:
+        return None
+    return (item.get('value') or '').strip() or None
+
+
+def downloadCatalog(per_host_limit=None):
+    '''
+    downloads the metadata of all the countries and indicators and replaces the catalog with it
+
+    Returns
+    -------
+    counts : tuple
+        (number of countries, number of indicators).
+    '''
+    countries=[]
+    for row in downloadRows('country', per_host_limit):
+        region=getLabel(row.get('region'))
+        countries.append((row['id'], row.get('iso2Code'), row.get('name'), region, getLabel(row.get('incomeLevel')),
+                          getLabel(row.get('lendingType')), row.get('capitalCity') or None,
+                          # the aggregates (regions, income groups...) have the region "Aggregates"
+                          int(region == 'Aggregates')))
+    indicators=[]
+    topics=[]
+    for row in downloadRows('indicator', per_host_limit):
+        names=[getLabel(topic) for topic in row.get('topics') or [] if getLabel(topic)]
+        indicators.append((row['id'], row.get('name'), getLabel(row.get('source')), row.get('unit') or None,
+                           '; '.join(names)))
+        topics.extend((topic, row['id']) for topic in names)
+
+    conn=getCatalogConnection()
+    with conn:
+        conn.execute('DELETE FROM countries')
+        conn.execute('DELETE FROM indicators')
+        conn.execute('DELETE FROM indicator_topics')
+        conn.executemany('INSERT OR REPLACE INTO countries VALUES (?, ?, ?, ?, ?, ?, ?, ?)', countries)
+        conn.executemany('INSERT OR REPLACE INTO indicators VALUES (?, ?, ?, ?, ?)', indicators)
+        conn.executemany('INSERT OR IGNORE INTO indicator_topics VALUES (?, ?)', topics)
+        if _catalogLocal.fts:
+            conn.execute("INSERT INTO countries_fts(countries_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO indicators_fts(indicators_fts) VALUES ('rebuild')")
+    return len(countries), len(indicators)
+
+
+def hasCatalog():
+    '''
+    True when the catalog has been downloaded
+    '''
+    # connecting would create an empty catalog file
+    if not os.path.exists(config.CATALOG_PATH):
+        return False
+    return getCatalogConnection().execute('SELECT 1 FROM countries LIMIT 1').fetchone() is not None
+
+
+def matchName(table, prefix):
+    '''
+    returns the SQL condition and its parameters selecting the rows of table whose name has a
+    word starting with prefix (FTS5), or whose name starts with prefix (LIKE fallback)
+    '''
+    words=prefix.split()
+    if getattr(_catalogLocal, 'fts', False) and words:
+        # every word of the prefix must start a word of the name, e.g. 'unit sta' -> United States
+        query=' '.join('"'+word.replace('"', '""')+'"*' for word in words)
+        return 'rowid IN (SELECT rowid FROM '+table+'_fts WHERE '+table+'_fts MATCH ?)', [query]
+    pattern=prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')+'%'
+    return "name LIKE ? ESCAPE '\\'", [pattern]
+
+
+def findCountries(code=None, name=None, region=None, income=None, aggregates=False, limit=None):
+    '''
+    looks up countries of the catalog, the given criteria are combined
+
+    Parameters
+    ----------
+    code : str, optional
+        ISO3 or ISO2 code, e.g. 'IND' or 'IN'.
+    name : str, optional
+        prefix of the name (or of words of the name when FTS5 is available), e.g. 'south'.
+    region : str, optional
+        region name, e.g. 'South Asia'.
+    income : str, optional
+        income group, e.g. 'High income'.
+    aggregates : bool, optional
+        include the aggregates (World, regions, income groups...). The default is False.
+    limit : int, optional
+        maximum number of countries returned.
+
+    Returns
+    -------
+    countries : list
+        Country tuples sorted by name.
+    '''
+    conn=getCatalogConnection()
+    conditions, parameters = [], []
+    if code is not None:
+        conditions.append('(code = ? OR iso2 = ?)')
+        parameters+=[code.upper(), code.upper()]
+    if name is not None:
+        condition, values = matchName('countries', name)
+        conditions.append(condition)
+        parameters+=values
+    if region is not None:
+        conditions.append('region = ? COLLATE NOCASE')
+        parameters.append(region)
+    if income is not None:
+        conditions.append('income = ? COLLATE NOCASE')
+        parameters.append(income)
+    if not aggregates:
+        conditions.append('aggregate = 0')
+    sql='SELECT code, iso2, name, region, income, lending, capital, aggregate FROM countries'
+    if conditions:
+        sql+=' WHERE '+' AND '.join(conditions)
+    sql+=' ORDER BY name'
+    if limit is not None:
+        sql+=' LIMIT '+str(int(limit))
+    return [Country(*row[:7], bool(row[7])) for row in conn.execute(sql, parameters)]
+
+
+def findIndicators(code=None, name=None, topic=None, source=None, limit=None):
+    '''
+    looks up indicators of the catalog, the given criteria are combined
+
+    Parameters
+    ----------
+    code : str, optional
+        indicator code, e.g. 'SP.POP.TOTL'.
+    name : str, optional
+        prefix of the name (or of words of the name when FTS5 is available), e.g. 'population'.
+    topic : str, optional
+        topic name, e.g. 'Energy & Mining'.
+    source : str, optional
+        source name, e.g. 'World Development Indicators'.
+    limit : int, optional
+        maximum number of indicators returned.
+
+    Returns
+    -------
+    indicators : list
+        Indicator tuples sorted by code.
+    '''
+    conn=getCatalogConnection()
+    conditions, parameters = [], []
+    if code is not None:
+        conditions.append('code = ?')
+        parameters.append(code)
+    if name is not None:
+        condition, values = matchName('indicators', name)
+        conditions.append(condition)
+        parameters+=values
+    if topic is not None:
+        conditions.append('code IN (SELECT code FROM indicator_topics WHERE topic = ? COLLATE NOCASE)')
+        parameters.append(topic)
+    if source is not None:
+        conditions.append('source = ? COLLATE NOCASE')
+        parameters.append(source)
+    sql='SELECT code, name, source, unit, topics FROM indicators'
+    if conditions:
+        sql+=' WHERE '+' AND '.join(conditions)
+    sql+=' ORDER BY code'
+    if limit is not None:
+        sql+=' LIMIT '+str(int(limit))
+    return [Indicator(code, name, source, unit, topics.split('; ') if topics else [])
+            for code, name, source, unit, topics in conn.execute(sql, parameters)]
+
+
+def getCountryMap(countries):
+    '''
+    returns the {ISO2 code: name} dict of some Country tuples, the form of config.countryMap
+    '''
+    return {country.iso2: country.name for country in countries}
+
+
+def getFeatureMap(indicators):
+    '''
+    returns the {code: name} dict of some Indicator tuples, the form of config.featureMap
+    '''
+    return {indicator.code: indicator.name for indicator in indicators}
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+command line of the package: python -m wbanalysis [fetch|build|analyze|render|all] [options]
+
+    fetch     download the data of the requested charts into the response cache
+    build     build the panel (from the cache, or refreshing the snapshot) and save the snapshot
+    analyze   clean the panel and compute its features
+    render    draw the requested charts
+    all       build, analyze and render (the default)
+    catalog   download the catalog of the World Bank countries and indicators, or search it
+
+analyze and render start from the snapshot when the whole configuration is requested, so a
+scheduler can run the cheap stages often and the expensive ones rarely.
+"""
+
+import argparse
+
+from . import config
+from .store import pa, hasSnapshot, loadSnapshot, refreshPanel, saveSnapshot, selectColumns, getIndicatorCode
+from .catalog import hasCatalog, downloadCatalog, findCountries, findIndicators, getCountryMap, getFeatureMap
+from .analysis import (display, cleanPanel, computeFeatures, rollupPanel, getWindow, planFetch, isFullPlan, loadPlan,
+                       countRequests, runAnalyses, ANALYSES, OUTPUTS)
+
+STAGES=['fetch', 'build', 'analyze', 'render', 'all', 'catalog']
+# weights of the rollups, by option value
+WEIGHTS={'population': 'Total Population', 'gdp': 'GDP in USD', 'none': None}
+
+
+def parseYears(text):
+    '''
+    parses a year range given as 'first:last' or a single year
+    '''
+    first, _, last = text.partition(':')
+    try:
+        first, last = int(first), int(last or first)
+    except ValueError:
+        raise argparse.ArgumentTypeError("years must be given as 'first:last', e.g. 2000:2010, not "+repr(text))
+    if last < first:
+        raise argparse.ArgumentTypeError('the last year comes before the first one: '+repr(text))
+    return first, last
+
+
+def getParser():
+    '''
+    returns the argument parser of the command line
+    '''
+    parser=argparse.ArgumentParser(prog='python -m wbanalysis', description='World Bank indicators analysis')
+    parser.add_argument('stage', nargs='?', choices=STAGES, default='all', help='stage to run (default: all)')
+    parser.add_argument('--countries', nargs='+', metavar='CODE',
+                        help='country codes to fetch, e.g. US IN (default: all of config.countryMap); '
+                             'codes missing from config.countryMap are looked up in the catalog')
+    parser.add_argument('--region', help="fetch the countries of a region of the catalog, e.g. 'South Asia'")
+    parser.add_argument('--income', help="fetch the countries of an income group of the catalog, e.g. 'High income'")
+    parser.add_argument('--indicators', nargs='+', metavar='INDICATOR',
+                        help="indicator codes or names to fetch, e.g. SP.POP.TOTL 'GDP in USD' (default: all); "
+                             "codes missing from config.featureMap are looked up in the catalog")
+    parser.add_argument('--years', type=parseYears, metavar='FIRST:LAST',
+                        help="range of years, e.g. 2000:2010 (default: "+config.params['date']+")")
+    parser.add_argument('--charts', nargs='+', choices=list(ANALYSES), metavar='CHART',
+                        help='charts to produce, among: '+', '.join(ANALYSES)+' (default: the standard charts)')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='requests in flight and render processes (default: config.MAX_IN_FLIGHT and config.RENDER_WORKERS)')
+    parser.add_argument('--rollup', choices=['region', 'income'],
+                        help='analyze: also aggregate the countries by region or income group (needs the catalog)')
+    parser.add_argument('--weights', choices=list(WEIGHTS), default='population',
+                        help='weights of the averages of the rollup (default: population)')
+    parser.add_argument('--search', metavar='TEXT', help='catalog: countries and indicators whose name starts with TEXT')
+    parser.add_argument('--topic', help="catalog: indicators of a topic, e.g. 'Energy & Mining'")
+    parser.add_argument('--update', action='store_true', help='catalog: download the catalog again')
+    parser.add_argument('--dry-run', action='store_true', help='print the fetch plan and its number of requests, then stop')
+    return parser
+
+
+def applySelection(parser, args):
+    '''
+    narrows the configuration of this run to the selected countries, indicators and years
+
+    Returns
+    -------
+    selected : bool
+        True when only a part of the configuration is requested.
+    '''
+    selected=False
+    countryMap={}
+    if args.countries:
+        for code in args.countries:
+            if code in config.countryMap:
+                countryMap[code]=config.countryMap[code]
+            else:
+                found=findCatalog(parser, findCountries, code=code, aggregates=True)
+                if not found:
+                    parser.error('unknown country code: '+code)
+                countryMap.update(getCountryMap(found))
+    if args.region or args.income:
+        countries=findCatalog(parser, findCountries, region=args.region, income=args.income)
+        if not countries:
+            parser.error('no country of the catalog in this region/income group')
+        countryMap.update(getCountryMap(countries))
+    if countryMap:
+        config.countryMap=countryMap
+        selected=True
+    if args.indicators:
+        codes={name: code for code, name in config.featureMap.items()}
+        indicators=[codes.get(indicator, indicator) for indicator in args.indicators]
+        for indicator in indicators:
+            if indicator not in config.featureMap:
+                found=findCatalog(parser, findIndicators, code=indicator)
+                if not found:
+                    parser.error('unknown indicator: '+indicator)
+                config.featureMap.update(getFeatureMap(found))
+        config.INDICATOR_CODES=[code for code in config.INDICATOR_CODES if code in indicators]+[
+            code for code in indicators if code not in config.INDICATOR_CODES]
+        selected=True
+    if args.years:
+        config.params['date']=str(args.years[0])+':'+str(args.years[1])
+        selected=True
+    if args.workers:
+        config.MAX_IN_FLIGHT=args.workers
+        config.RENDER_WORKERS=args.workers
+    return selected
+
+
+def findCatalog(parser, find, **criteria):
+    '''
+    runs a lookup of the catalog, stopping with an error when the catalog was never downloaded
+    '''
+    if not hasCatalog():
+        parser.error('the catalog is needed for this selection, run: python -m wbanalysis catalog')
+    return find(**criteria)
+
+
+def catalogStage(args):
+    '''
+    downloads the catalog when it is missing (or with --update), then prints the countries and
+    indicators matching --search, --topic, --region and --income
+    '''
+    if args.update or not hasCatalog():
+        countries, indicators = downloadCatalog()
+        print('catalog downloaded: '+str(countries)+' countries and aggregates, '+str(indicators)+' indicators')
+    if args.search or args.region or args.income:
+        for country in findCountries(name=args.search, region=args.region, income=args.income, aggregates=True):
+            print('{:<4} {:<3} {:<40} {:<30} {}'.format(country.code, country.iso2 or '', country.name,
+                                                       country.region or '', country.income or ''))
+    if args.search or args.topic:
+        for indicator in findIndicators(name=args.search, topic=args.topic):
+            print('{:<25} {}'.format(indicator.code, indicator.name))
+
+
+def planRollup(plan, weights):
+    '''
+    adds the weights of the rollup to the plan, over all the countries and years of the plan,
+    so every aggregated value has its weight
+    '''
+    if not plan or WEIGHTS[weights] is None:
+        return plan
+    indicator=getIndicatorCode(WEIGHTS[weights])
+    countries, first, last = plan.get(indicator, ([], None, None))
+    for planned, planned_first, planned_last in plan.values():
+        countries=countries+[code for code in planned if code not in countries]
+        first=planned_first if first is None else min(first, planned_first)
+        last=planned_last if last is None else max(last, planned_last)
+    plan=dict(plan)
+    plan[indicator]=(countries, first, last)
+    return plan
+
+
+def printPlan(plan):
+    '''
+    prints the fetch plan with the number of requests of every indicator
+    '''
+    counts=countRequests(plan, config.BATCHED_FETCH)
+    print('{:<20} {:>9} {:>11} {:>9}'.format('indicator', 'countries', 'years', 'requests'))
+    for indicator, (countries, first, last) in plan.items():
+        print('{:<20} {:>9} {:>11} {:>9}'.format(indicator, len(countries), str(first)+'-'+str(last), counts[indicator]))
+    print('total requests: '+str(sum(counts.values()))+' (before the response cache)')
+
+
+def buildStage(plan, selected):
+    '''
+    builds the panel of the plan: refreshes the snapshot when there is one, otherwise fetches the
+    plan; the panel of the whole configuration is saved as the new snapshot
+    '''
+    fetchFailures=[]
+    snapshotExists=hasSnapshot(config.SNAPSHOT_DIR) and not selected
+    if config.LOAD_SNAPSHOT and snapshotExists:
+        # only the columns of the plan are read from the snapshot
+        panel=loadSnapshot(config.SNAPSHOT_DIR, [config.featureMap[indicator] for indicator in plan])
+    elif config.INCREMENTAL_REFRESH and snapshotExists:
+        # only the indicators and countries of the plan are refreshed, and the snapshot is only
+        # replaced by a refresh of the whole configuration
+        fullPlan=isFullPlan(plan)
+        country_codes=[code for code in config.countryMap if any(code in countries for countries, first, last in plan.values())]
+        stored=loadSnapshot(config.SNAPSHOT_DIR, None if fullPlan else [config.featureMap[indicator] for indicator in plan])
+        panel=refreshPanel(stored, country_codes, check_revisions=config.CHECK_REVISIONS, failures=fetchFailures)
+        if fullPlan:
+            saveSnapshot(panel, config.SNAPSHOT_DIR)
+    else:
+        panel=loadPlan(plan, batched=config.BATCHED_FETCH, failures=fetchFailures)
+        # keep a copy of the dataset of this run, the plotting stages can start from it later
+        if pa is not None and not selected and isFullPlan(plan):
+            saveSnapshot(panel, config.SNAPSHOT_DIR)
+    for failure in fetchFailures:
+        print("Error in Loading the data for "+failure.country+"/"+failure.indicator+": "+str(failure.message))
+    display(panel.head())
+
+    print("Data Loading Completed")
+    return panel
+
+
+def readPanel(plan, selected):
+    '''
+    returns the panel of the plan for the analyze and render stages: the columns of the plan
+    read from the snapshot when it holds the whole configuration, otherwise built by buildStage
+    (from the response cache when fetch ran before)
+    '''
+    if hasSnapshot(config.SNAPSHOT_DIR) and not selected:
+        return loadSnapshot(config.SNAPSHOT_DIR, [config.featureMap[indicator] for indicator in plan])
+    return buildStage(plan, selected)
+
+
+def analyzeStage(panel, rollup=None, weights='population'):
+    '''
+    cleans the panel and computes its features, and its rollup by region or income group if requested.
+    The flat view is taken from the cleaned panel, and so are the features when the cleaning keeps
+    every (country, year) row (see getChartPanel). The rollup reads the full panel so that every
+    country keeps its weight.
+
+    Returns
+    -------
+    cleanedPanel : DataFrame
+        the panel cleaned by cleanPanel with the CLEAN_* settings.
+    '''
+    # clean all the countries in one pass
+    cleanedPanel=cleanPanel(panel, how=config.CLEAN_HOW, min_coverage=config.CLEAN_MIN_COVERAGE, interpolate_limit=config.CLEAN_INTERPOLATE_LIMIT)
+    display(cleanedPanel)
+    # flat view of the cleaned panel with the Country and Year columns
+    df = selectColumns(cleanedPanel, list(cleanedPanel.columns))
+
+    #the dtypes come from the schema applied when the panel is built (see buildSchema),
+    #Country is categorical and Year a (nullable) integer
+
+    print(df.dtypes)
+
+    # growth, yearly change, 3 year rolling mean/std of every series, and the GDP per capita when both are loaded
+    gridPanel=getChartPanel(panel, cleanedPanel)
+    features=computeFeatures(gridPanel, window=3, per_capita=[column for column in ['GDP in USD'] if 'Total Population' in gridPanel and column in gridPanel])
+    display(features.head())
+
+    if rollup is not None:
+        # weighted aggregates of the groups computed from the panel, no aggregate code is requested
+        display(rollupPanel(panel, rollup, WEIGHTS[weights]))
+    return cleanedPanel
+
+
+def getChartPanel(panel, cleanedPanel=None):
+    '''
+    returns the panel the charts are drawn from: the cleaned panel when the cleaning keeps every
+    (country, year) row (CLEAN_HOW=None, e.g. with interpolation), the full panel otherwise since
+    the charts read the whole grid of years
+    '''
+    if config.CLEAN_HOW is not None:
+        return panel
+    if cleanedPanel is None:
+        cleanedPanel=cleanPanel(panel, how=None, min_coverage=config.CLEAN_MIN_COVERAGE, interpolate_limit=config.CLEAN_INTERPOLATE_LIMIT)
+    return cleanedPanel
+
+
+def main(argv=None):
+    '''
+    runs the stage given on the command line (argv defaults to sys.argv[1:])
+    '''
+    parser=getParser()
+    args=parser.parse_args(argv)
+    if args.stage == 'catalog':
+        catalogStage(args)
+        return
+    if args.rollup is not None and not hasCatalog():
+        parser.error('the catalog is needed for --rollup, run: python -m wbanalysis catalog')
+    selected=applySelection(parser, args)
+    outputs=args.charts or OUTPUTS
+    
+    # work out what the requested charts need, and fetch only that with the concurrent fetch engine
+    # all the countries are kept in a single panel indexed by (country, year)
+    if args.charts:
+        for name in args.charts:
+            if getWindow(name) is None:
+                first, last = ANALYSES[name]['years']
+                parser.error("the chart '"+name+"' reads the years "+str(first or '')+'-'+str(last or '')
+                             +', none of them is within '+str(config.params['date']))
+    plan=planFetch(outputs)
+    if not plan:
+        parser.error('nothing to fetch for this selection')
+    if args.rollup is not None and args.stage in ('analyze', 'all'):
+        plan=planRollup(plan, args.weights)
+    if args.dry_run:
+        printPlan(plan)
+        return
+    
+    if args.stage == 'fetch':
+        # the responses land in the cache, the panel itself is not kept
+        fetchFailures=[]
+        loadPlan(plan, batched=config.BATCHED_FETCH, failures=fetchFailures)
+        for failure in fetchFailures:
+            print("Error in Loading the data for "+failure.country+"/"+failure.indicator+": "+str(failure.message))
+        print("Data Loading Completed")
+    elif args.stage == 'build':
+        buildStage(plan, selected)
+    elif args.stage == 'analyze':
+        analyzeStage(readPanel(plan, selected), args.rollup, args.weights)
+    elif args.stage == 'render':
+        #statistical analysis.........
+        runAnalyses(outputs, getChartPanel(readPanel(plan, selected)))
+    else:
+        panel=buildStage(plan, selected)
+        cleanedPanel=analyzeStage(panel, args.rollup, args.weights)
+        #statistical analysis.........
+        runAnalyses(outputs, getChartPanel(panel, cleanedPanel))
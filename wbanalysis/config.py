@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+settings of the package: the countries and indicators, the API parameters and the tuning
+constants of the fetch, cache, snapshot, cleaning and rendering stages.
+They are read when used, so they can be changed at run time, e.g. config.MAX_RETRIES=2.
+"""
+
+import os
+
+#code for extracting data
+# Base URL used in all the API calls
+# it can be pointed to a local stub server with the WB_BASE_URL environment variable
+BASE_URL=os.environ.get('WB_BASE_URL', 'http://api.worldbank.org/v2/')
+
+# List of indicators according to the features defined above
+INDICATOR_CODES = ['SP.POP.TOTL', 'SP.POP.TOTL.FE.IN', 'SP.POP.TOTL.MA.IN','SP.DYN.CBRT.IN','SP.DYN.CDRT.IN','EG.USE.ELEC.KH.PC', 'EG.FEC.RNEW.ZS' , 'EG.USE.COMM.FO.ZS' , 'SL.IND.EMPL.ZS' , 'SL.AGR.EMPL.ZS' , 'NY.GDP.MKTP.CD' ]
+country_list=['USA', 'India', 'China', 'Japan', 'Canada', 'Great Britain', 'South Africa']
+#renaming the features into the meaningful names
+featureMap={
+    "SP.POP.TOTL": "Total Population",
+    "SP.POP.TOTL.FE.IN": "Female Population",
+    "SP.POP.TOTL.MA.IN": "Male Population",
+    "SP.DYN.CBRT.IN": "Birth Rate",
+    "SP.DYN.CDRT.IN": "Death Rate",
+    "EG.USE.ELEC.KH.PC":"Electric Power Consumption(kWH per capita)",
+    "EG.FEC.RNEW.ZS":"Renewable Energy Consumption (%)",
+    "EG.USE.COMM.FO.ZS":"Fossil Fuel Consumption (%)",
+    "SL.IND.EMPL.ZS":"Employment in Industry(%)",
+    "SL.AGR.EMPL.ZS": "Employment in Agriculture(%)",
+    "NY.GDP.MKTP.CD": "GDP in USD"
+    }
+#renaming country codes with their actual names for better understanding
+countryMap={
+    "US": "USA",
+    "IN":"India",
+    "CN": "China",
+    "JP": "Japan",
+    "CA": "Canada",
+    "GB": "Great Britain",
+    "ZA": "South Africa"
+    }
+# dtypes of the panel: keep the percentage indicators as float32 to halve their memory
+FLOAT32_PERCENTAGES=False
+# dtype of the years, a nullable integer
+YEAR_DTYPE='Int16'
+# indicators which add up over countries (counts and amounts), the rollups sum them;
+# the other indicators (rates, shares, per capita values) are averaged with weights
+SUM_INDICATORS=['SP.POP.TOTL', 'SP.POP.TOTL.FE.IN', 'SP.POP.TOTL.MA.IN', 'NY.GDP.MKTP.CD']
+
+# constant parameters used in sending the request.
+params = dict()
+# to ensure we receive a JSON response
+params['format']='json'
+# The page size (per_page) is not fixed here, it is chosen for every query from the number of
+# countries and years requested, and the remaining pages are fetched when a query has more than one.
+# Range of years for which the data is needed
+params['date']='1960:2018'
+
+# maximum number of requests in flight at the same time
+MAX_IN_FLIGHT=16
+# maximum number of requests in flight against a single host, to stay polite with the API
+PER_HOST_LIMIT=8
+# request each indicator for all the countries of countryMap in one call instead of one call per country
+BATCHED_FETCH=True
+# maximum number of countries joined into one batched call, keeps the url short when countryMap grows
+MAX_BATCH_COUNTRIES=60
+# largest page size asked from the API, bigger queries are split into several pages
+MAX_PAGE_SIZE=10000
+
+# seconds to wait for the server before giving up on a request
+REQUEST_TIMEOUT=30
+# number of times a request is retried after a 429/5xx answer or a connection error
+MAX_RETRIES=4
+# status codes which are worth retrying
+RETRY_STATUS_CODES={429, 500, 502, 503, 504}
+# first wait before a retry and the maximum wait, in seconds
+BACKOFF_BASE=0.5
+BACKOFF_MAX=30
+
+# decode big payloads incrementally with ijson when it is installed
+STREAM_DECODE=True
+# payloads smaller than this (in bytes) are faster to decode in one go with the json module
+STREAM_DECODE_MIN_BYTES=1000000
+
+# keep the raw API payloads in a local SQLite file so repeated runs do not download them again
+CACHE_ENABLED=True
+# location of the cache file, can be changed with the WB_CACHE_PATH environment variable
+CACHE_PATH=os.environ.get('WB_CACHE_PATH', 'wb_cache.sqlite')
+# seconds a cached payload is used without asking the server (one week)
+CACHE_TTL=7*24*60*60
+
+# local catalog of the World Bank countries and indicators (see catalog), can be changed with the
+# WB_CATALOG_PATH environment variable
+CATALOG_PATH=os.environ.get('WB_CATALOG_PATH', 'wb_catalog.sqlite')
+
+# directory where the panel of each run is saved (needs pyarrow)
+SNAPSHOT_DIR=os.environ.get('WB_SNAPSHOT_DIR', 'snapshot')
+# start from the saved snapshot instead of the API when there is one
+LOAD_SNAPSHOT=False
+# cleaning policy: drop the rows with 'any' missing value, with 'all' values missing, or None;
+# None keeps every (country, year) row and the charts are then drawn from the cleaned panel
+CLEAN_HOW='any'
+# minimum share of known values an indicator needs to be kept by the cleaning (None keeps all)
+CLEAN_MIN_COVERAGE=None
+# longest gap (in years) filled by linear interpolation before dropping rows (None disables it)
+CLEAN_INTERPOLATE_LIMIT=None
+
+# when there is a snapshot, only request the years after its last values
+INCREMENTAL_REFRESH=True
+# during an incremental refresh, download again the indicators revised since the snapshot
+CHECK_REVISIONS=False
+# seconds the cached answers of the refresh requests are used without asking the server again:
+# shorter than a day, so a daily refresh sees a newly published year, but repeated runs within
+# the hour send no request. Older answers are revalidated (a 304 costs no download)
+REFRESH_TTL=60*60
+
+# number of processes rendering the charts (1 renders them one after the other in this process)
+RENDER_WORKERS=min(8, os.cpu_count() or 1)
+# draw the charts repeated for many countries from one figure per process, updating only their data
+RENDER_TEMPLATES=True
+# keep every rendered image under the fingerprint of its data and settings, and copy it from there
+# instead of drawing it again while they do not change
+RENDER_CACHE_ENABLED=True
+# location of the render cache, can be changed with the WB_RENDER_CACHE environment variable
+RENDER_CACHE_DIR=os.environ.get('WB_RENDER_CACHE', 'render_cache')
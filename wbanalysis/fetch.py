@@ -0,0 +1,601 @@
+# -*- coding: utf-8 -*-
+"""
+fetching the World Bank indicators: pooled HTTP session with retries, on-disk response cache,
+payload decoding, pagination and the concurrent fetch of every (countries, indicator) query
+into a float64 block of values.
+
+This module does not import pandas nor any plotting library.
+"""
+
+import threading
+import sqlite3
+import time
+import json
+import zlib
+import random
+import io
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlencode
+import numpy as np
+import requests
+# ijson is optional, it is only used to decode big payloads incrementally
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from . import config
+
+# one semaphore per host, so that the thread pool never opens more than
+# per_host_limit connections to the same server at the same time, and one per max_in_flight
+# value, so the pages fetched by the nested pools stay within the limit of the outer pool
+_hostLimits={}
+_inFlightLimits={}
+_hostLimitsLock=threading.Lock()
+
+def getHostLimit(url, per_host_limit):
+    '''
+    returns the semaphore which limits the number of requests in flight for the host of the url
+    '''
+    key=(urlsplit(url).netloc, per_host_limit)
+    with _hostLimitsLock:
+        if key not in _hostLimits:
+            _hostLimits[key]=threading.BoundedSemaphore(per_host_limit)
+        return _hostLimits[key]
+
+
+def getInFlightLimit(max_in_flight):
+    '''
+    returns the semaphore which limits the number of requests in flight over all the hosts
+    '''
+    with _hostLimitsLock:
+        if max_in_flight not in _inFlightLimits:
+            _inFlightLimits[max_in_flight]=threading.BoundedSemaphore(max_in_flight)
+        return _inFlightLimits[max_in_flight]
+
+
+#----------------------------------------------------------------------------------------------------
+# pooled HTTP session with retries
+# a single requests.Session keeps the TCP/TLS connections alive between calls, and every call
+# is retried with exponential backoff and jitter when the server answers 429/5xx or the connection drops
+
+# structured result returned for a failed call instead of printing an error message
+FetchFailure=namedtuple('FetchFailure', ['country', 'indicator', 'status_code', 'message'])
+
+_session=None
+_sessionLock=threading.Lock()
+
+def getSession():
+    '''
+    returns the shared requests.Session, with a connection pool big enough for all the workers
+    '''
+    global _session
+    with _sessionLock:
+        if _session is None:
+            session=requests.Session()
+            # pool_connections is the number of hosts whose pool is kept (the API is a single host),
+            # pool_maxsize the connections kept alive per host, enough for all the requests in flight
+            adapter=requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(config.MAX_IN_FLIGHT, config.PER_HOST_LIMIT))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session=session
+        return _session
+
+
+def sendRequest(url, query, headers=None):
+    '''
+    sends a GET request on the shared session, retrying up to MAX_RETRIES times on 429/5xx
+    answers and connection errors. The wait before each retry grows exponentially
+    (BACKOFF_BASE, 2*BACKOFF_BASE, 4*BACKOFF_BASE, ... capped at BACKOFF_MAX) and is randomised
+    so that the workers do not retry in lockstep; a Retry-After header from the server is honoured
+    up to BACKOFF_MAX.
+
+    Returns
+    -------
+    response : requests.Response
+        the last response received.
+
+    Raises
+    ------
+    requests.RequestException
+        if the last attempt failed without a response.
+    '''
+    session=getSession()
+    for attempt in range(config.MAX_RETRIES+1):
+        try:
+            response=session.get(url, params=query, headers=headers, timeout=config.REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == config.MAX_RETRIES:
+                raise
+            response=None
+        
+        if response is not None and response.status_code not in config.RETRY_STATUS_CODES:
+            return response
+        if attempt == config.MAX_RETRIES:
+            return response
+        
+        # full jitter: sleep a random time between 0 and the exponential backoff
+        delay=random.uniform(0, min(config.BACKOFF_MAX, config.BACKOFF_BASE*2**attempt))
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            # never wait longer than BACKOFF_MAX, whatever the server asks
+            delay=min(config.BACKOFF_MAX, max(delay, float(response.headers['Retry-After'])))
+        time.sleep(delay)
+
+
+#----------------------------------------------------------------------------------------------------
+# on-disk response cache
+# the 1960-2018 history barely changes, so the raw payloads are kept in a SQLite file and reused
+# for CACHE_TTL seconds. After that the server is asked with If-None-Match/If-Modified-Since
+# and a 304 answer refreshes the stored copy without downloading it again.
+
+_cacheLocal=threading.local()
+
+def getCacheConnection():
+    '''
+    returns the SQLite connection of the current thread, creating the cache table on first use
+    '''
+    conn=getattr(_cacheLocal, 'conn', None)
+    if conn is None or getattr(_cacheLocal, 'path', None) != config.CACHE_PATH:
+        conn=sqlite3.connect(config.CACHE_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                            key TEXT PRIMARY KEY,
+                            body BLOB,
+                            etag TEXT,
+                            last_modified TEXT,
+                            fetched_at REAL)''')
+        _cacheLocal.conn=conn
+        _cacheLocal.path=config.CACHE_PATH
+    return conn
+
+
+class CachedResponse:
+    '''
+    minimal stand-in for requests.Response used when the payload comes from the cache
+    '''
+    def __init__(self, content, status_code=200):
+        self.content=content
+        self.status_code=status_code
+
+
+def cachedGet(url, query, ttl=None):
+    '''
+    sends a GET request through the on-disk cache.
+    The cache key is the url (which holds the country and the indicator) plus the query parameters.
+
+    Parameters
+    ----------
+    url : str
+        the endpoint, e.g. BASE_URL+'countries/us/indicators/SP.POP.TOTL'.
+    query : dict
+        the request parameters, e.g. params.
+    ttl : float, optional
+        seconds a stored payload is used without asking the server, defaults to CACHE_TTL.
+
+    Returns
+    -------
+    response : requests.Response or CachedResponse
+        the response, with the status_code and the raw content of the server answer.
+    '''
+    if not config.CACHE_ENABLED:
+        return sendRequest(url, query)
+    if ttl is None:
+        ttl=config.CACHE_TTL
+    
+    key=url+'?'+urlencode(sorted(query.items()))
+    conn=getCacheConnection()
+    row=conn.execute('SELECT body, etag, last_modified, fetched_at FROM responses WHERE key=?', (key,)).fetchone()
+    
+    # fresh enough, no network call at all
+    if row is not None and time.time()-row[3] < ttl:
+        return CachedResponse(zlib.decompress(row[0]))
+    
+    # stale or missing, revalidate with the validators the server gave us last time
+    headers={}
+    if row is not None:
+        if row[1]:
+            headers['If-None-Match']=row[1]
+        if row[2]:
+            headers['If-Modified-Since']=row[2]
+    response=sendRequest(url, query, headers)
+    
+    if response.status_code == 304 and row is not None:
+        # not modified, keep the stored payload for another ttl
+        with conn:
+            conn.execute('UPDATE responses SET fetched_at=? WHERE key=?', (time.time(), key))
+        return CachedResponse(zlib.decompress(row[0]))
+    
+    # only store real data, the API reports errors as [{"message": ...}] with a status code 200
+    if response.status_code == 200 and b'"message"' not in response.content[:16]:
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                         (key, zlib.compress(response.content), response.headers.get('ETag'),
+                          response.headers.get('Last-Modified'), time.time()))
+    return response
+
+
+#----------------------------------------------------------------------------------------------------
+# decoding the payloads
+# every response body is decoded exactly once into the page metadata and an iterable of observations.
+# Big multi-country pages can be decoded incrementally with ijson (when it is installed), so the
+# observations flow one by one into the value lists without building the whole document in memory.
+
+def decodePayload(content):
+    '''
+    decodes a response body of the form [{"page": 1, "pages": 1, ...}, [{"date": "2018", "value": ...}, ...]]
+
+    Parameters
+    ----------
+    content : bytes
+        the raw response body.
+
+    Returns
+    -------
+    meta : dict
+        the page metadata, or the error details in meta["message"] if the call was rejected.
+    rows : iterable
+        the observations of the page, a generator when the body is decoded incrementally.
+
+    Raises
+    ------
+    ValueError
+        if the body is not a valid World Bank JSON payload.
+    '''
+    if ijson is not None and config.STREAM_DECODE and len(content) >= config.STREAM_DECODE_MIN_BYTES:
+        return streamPayload(content)
+    
+    payload=json.loads(content)
+    if not isinstance(payload, list) or not payload or not isinstance(payload[0], dict):
+        raise ValueError('unexpected payload')
+    # the observations are missing (or null) when there is no data for the query
+    rows=payload[1] if len(payload) > 1 and payload[1] else []
+    return payload[0], rows
+
+
+def streamPayload(content):
+    '''
+    incremental version of decodePayload based on the ijson event parser.
+    The metadata object is built straight away, the observations are built one at a time
+    while the returned generator is consumed.
+    '''
+    events=parseEvents(content)
+    for prefix, event, value in events:
+        if prefix == 'item' and event == 'start_map':
+            return buildObject(events, 'item'), streamRows(events)
+        if prefix != '' or event != 'start_array':
+            break
+    raise ValueError('unexpected payload')
+
+
+def parseEvents(content):
+    '''
+    yields the ijson parser events of the body, reporting parse errors as ValueError like json.loads
+    '''
+    try:
+        yield from ijson.parse(io.BytesIO(content))
+    except ijson.JSONError as error:
+        raise ValueError(str(error)) from error
+
+
+def buildObject(events, prefix):
+    '''
+    builds the object which has just been opened at prefix, consuming its events
+    '''
+    builder=ijson.ObjectBuilder()
+    builder.event('start_map', None)
+    for eventPrefix, event, value in events:
+        builder.event(event, value)
+        if eventPrefix == prefix and event == 'end_map':
+            return builder.value
+    raise ValueError('truncated payload')
+
+
+def streamRows(events):
+    '''
+    yields the observations of the second element of the payload one by one
+    '''
+    for prefix, event, value in events:
+        if prefix == 'item.item' and event == 'start_map':
+            yield buildObject(events, 'item.item')
+
+
+def parseValue(value):
+    '''
+    converts the value of one observation, None for the years without a value
+    '''
+    # check for empty values
+    if value == "" or value is None:
+        return None
+    return float(value)
+
+
+def errorMessage(meta):
+    '''
+    extracts the error details of a rejected call, the API puts them in
+    [{"message": [{"id": "120", "key": "Invalid value", "value": "..."}]}]
+    '''
+    try:
+        return meta['message'][0]['value']
+    except (LookupError, TypeError):
+        return str(meta['message'])
+
+
+#----------------------------------------------------------------------------------------------------
+# pagination
+# the first page tells how many pages the query has, the remaining pages are then fetched concurrently
+
+# one page of a query, error is None when the page was received and decoded
+Page=namedtuple('Page', ['status_code', 'meta', 'rows', 'error'])
+
+def getYearRange():
+    '''
+    returns the (first, last) year requested in params['date'], e.g. (1960, 2018) for '1960:2018'
+    '''
+    bounds=str(config.params['date']).split(':')
+    return int(bounds[0]), int(bounds[-1])
+
+
+def getPageSize(expected_rows):
+    '''
+    picks the page size for a query expected to return expected_rows observations:
+    large enough for a single page, but never above MAX_PAGE_SIZE
+    '''
+    return max(1, min(expected_rows, config.MAX_PAGE_SIZE))
+
+
+def fetchPage(url, query, per_host_limit, ttl=None, max_in_flight=None):
+    '''
+    sends the request for one page and decodes it once, ttl is passed on to cachedGet.
+    At most max_in_flight requests (defaults to MAX_IN_FLIGHT) are sent at the same time.
+
+    Returns
+    -------
+    page : Page
+        status code, metadata and observations of the page, or the error details.
+    '''
+    if max_in_flight is None:
+        max_in_flight=config.MAX_IN_FLIGHT
+    try:
+        # send the request using the resquests module, waiting for a free slot overall and on the host first
+        with getInFlightLimit(max_in_flight), getHostLimit(url, per_host_limit):
+            response = cachedGet(url, query, ttl)
+    except requests.RequestException as error:
+        return Page(None, None, [], str(error))
+    
+    if response.status_code != 200:
+        return Page(response.status_code, None, [], 'HTTP status '+str(response.status_code))
+    
+    try:
+        # the response is an array containing two arrays - [[{page: 1, ...}], [{year: 2018, SP.POP.TOTL: 123455}, ...]]
+        meta, rows = decodePayload(response.content)
+    except ValueError as error:
+        return Page(response.status_code, None, [], 'invalid response: '+str(error))
+    
+    # The API returns a status_code 200 even for error messages,
+    # however, the response body contains a field called "message" that includes the details of the error
+    if "message" in meta:
+        return Page(response.status_code, meta, [], errorMessage(meta))
+    return Page(response.status_code, meta, rows, None)
+
+
+def fetchAllPages(url, query, expected_rows, per_host_limit, ttl=None, max_in_flight=None):
+    '''
+    fetches every page of a query. The page size is chosen from the number of expected
+    observations, the "pages" field of the first page drives the rest of the pagination and
+    the remaining pages are requested concurrently, so wider date ranges or bigger batches of
+    countries are never silently truncated. The pages count against max_in_flight like the
+    other requests (see fetchPage).
+
+    Returns
+    -------
+    pages : list
+        the Page objects in page order; the last one carries the error if a page failed.
+    '''
+    query=dict(query)
+    query['per_page']=str(getPageSize(expected_rows))
+    query['page']='1'
+    first=fetchPage(url, query, per_host_limit, ttl, max_in_flight)
+    if first.error is not None:
+        return [first]
+    
+    pages=int(first.meta.get('pages') or 1)
+    if pages <= 1:
+        return [first]
+    
+    queries=[dict(query, page=str(page)) for page in range(2, pages+1)]
+    with ThreadPoolExecutor(max_workers=min(len(queries), per_host_limit)) as pool:
+        rest=list(pool.map(lambda pageQuery: fetchPage(url, pageQuery, per_host_limit, ttl, max_in_flight), queries))
+    
+    for index, page in enumerate(rest):
+        if page.error is not None:
+            return [first]+rest[:index+1]
+    return [first]+rest
+
+
+def getYears():
+    '''
+    returns the years of the rows of the value matrices in increasing order, e.g. [1960, 1961, ..., 2018]
+    '''
+    first_year, last_year = getYearRange()
+    return np.arange(first_year, last_year+1)
+
+
+# Function to get the values of one indicator for one or several countries from the endpoint
+def fetchIndicator(country_codes, indicator, columns, per_host_limit=None, years=None, ttl=None, lastUpdated=None,
+                   max_in_flight=None):
+    '''
+    sends the request for one indicator and writes the values straight into the value matrices.
+    The API accepts a semicolon separated list of countries, e.g. countries/us;in;cn/indicators/SP.POP.TOTL,
+    so a whole batch of countries can be requested at once; the rows are split back out by the
+    country id of each observation and placed in the row of their "date", so a missing year
+    simply stays NaN instead of shifting the following values.
+
+    Parameters
+    ----------
+    country_codes : list
+        country codes of the batch, a single country is a batch of one.
+    indicator : str
+        indicator code, e.g. 'SP.POP.TOTL'.
+    columns : dict
+        country code -> float64 column (one value per requested year, prefilled with NaN)
+        receiving the values of the indicator.
+    per_host_limit : int, optional
+        maximum number of requests in flight against one host, defaults to PER_HOST_LIMIT.
+    years : tuple, optional
+        (first, last) years to request, defaults to the range of params['date'].
+    ttl : float, optional
+        passed on to cachedGet, 0 always asks the server.
+    lastUpdated : dict, optional
+        if given, receives indicator -> "lastupdated" date reported by the API.
+    max_in_flight : int, optional
+        maximum number of requests in flight, pages included, defaults to MAX_IN_FLIGHT.
+
+    Returns
+    -------
+    failure : FetchFailure or None
+        the details of the failed call, None if all the pages were received.
+    '''
+    if per_host_limit is None:
+        per_host_limit=config.PER_HOST_LIMIT
+    
+    # form the URL in the desired format
+    # E.g: http://api.worldbank.org/v2/countries/us;in/indicators/SP.POP.TOTL?format=json&per_page=118&date=1960:2018
+    url=config.BASE_URL+'countries/'+';'.join(code.lower() for code in country_codes)+'/indicators/'+indicator
+    batch=';'.join(country_codes)
+    first_year, last_year = getYearRange() if years is None else years
+    query=dict(config.params, date=str(first_year)+':'+str(last_year))
+    
+    for page in fetchAllPages(url, query, len(country_codes)*(last_year-first_year+1), per_host_limit, ttl, max_in_flight):
+        if page.error is None:
+            if lastUpdated is not None and page.meta.get('lastupdated'):
+                lastUpdated[indicator]=page.meta['lastupdated']
+            try:
+                for obj in page.rows:
+                    # each row carries the 2 letter code of its country, e.g. {"country": {"id": "US", ...}, "date": "2018", ...}
+                    column=columns.get(obj['country']['id'].upper())
+                    year=int(obj['date'])
+                    value=parseValue(obj['value'])
+                    if column is not None and value is not None and first_year <= year <= last_year:
+                        column[year-first_year]=value
+                continue
+            except (ValueError, LookupError, TypeError) as error:
+                page=page._replace(error='invalid response: '+str(error))
+        
+        # forget the values of the pages already written, the indicator is reported as failed
+        for column in columns.values():
+            column[:]=np.nan
+        return FetchFailure(batch, indicator, page.status_code, page.error)
+    return None
+
+
+def runFetchTasks(tasks, max_workers=None, per_host_limit=None, failures=None, lastUpdated=None, ttl=None):
+    '''
+    runs fetch tasks concurrently on a pool of max_workers threads (defaults to MAX_IN_FLIGHT),
+    which is also the limit of the requests in flight once the tasks fetch their further pages
+
+    Parameters
+    ----------
+    tasks : list
+        (country codes of the batch, indicator, (first, last) years, columns) tuples,
+        passed on to fetchIndicator.
+    max_workers, per_host_limit, failures, lastUpdated :
+        as for loadAllCountries.
+    ttl : float, optional
+        passed on to cachedGet.
+    '''
+    if max_workers is None:
+        max_workers=config.MAX_IN_FLIGHT
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results=list(pool.map(
+            lambda task: fetchIndicator(task[0], task[1], task[3], per_host_limit, task[2], ttl, lastUpdated, max_workers),
+            tasks))
+    if failures is not None:
+        failures.extend(failure for failure in results if failure is not None)
+
+
+def loadAllCountries(country_codes, max_workers=None, per_host_limit=None, batched=False, batch_size=None, failures=None, lastUpdated=None):
+    '''
+    fetches every country x indicator pair concurrently instead of one request after another.
+    The wall-clock of a refresh is dominated by network latency, so keeping several requests
+    in flight at once cuts it down roughly by the number of workers.
+
+    Parameters
+    ----------
+    country_codes : list
+        country codes as used in countryMap, e.g. ['US', 'IN'].
+    max_workers : int, optional
+        maximum number of requests in flight, defaults to MAX_IN_FLIGHT.
+    per_host_limit : int, optional
+        maximum number of requests in flight against one host, defaults to PER_HOST_LIMIT.
+    batched : bool, optional
+        request each indicator for a whole batch of countries in one call
+        (11 requests instead of 77 for the 7 countries) instead of one call per pair.
+    batch_size : int, optional
+        maximum number of countries in one batched call, defaults to MAX_BATCH_COUNTRIES.
+    failures : list, optional
+        if given, a FetchFailure is appended to it for every call that failed. The values
+        of a failed indicator are left as NaN.
+    lastUpdated : dict, optional
+        if given, receives indicator -> "lastupdated" date reported by the API.
+
+    Returns
+    -------
+    values : numpy.ndarray
+        float64 block of shape (countries, years, indicators) in the order of country_codes,
+        getYears() and INDICATOR_CODES, NaN where the API has no value.
+    '''
+    if batch_size is None:
+        batch_size=config.MAX_BATCH_COUNTRIES
+    if not batched:
+        batch_size=1
+    
+    # one preallocated block for all the countries, every request fills its own columns of it
+    values=np.full((len(country_codes), len(getYears()), len(config.INDICATOR_CODES)), np.nan)
+    rows={country_code: i for i, country_code in enumerate(country_codes)}
+    
+    # every (batch of countries, indicator) pair is one request
+    batches=[country_codes[i:i+batch_size] for i in range(0, len(country_codes), batch_size)]
+    tasks=[(batch, indicator, getYearRange(), {country_code: values[rows[country_code], :, j] for country_code in batch})
+           for j, indicator in enumerate(config.INDICATOR_CODES) for batch in batches]
+    
+    runFetchTasks(tasks, max_workers, per_host_limit, failures, lastUpdated)
+    return values
+
+
+# Function to get JSON data from the endpoint
+def loadJSONData(country_code, max_workers=None, per_host_limit=None, failures=None): 
+    '''
+    this is a function which will use country codes and indicators with base url from the internet and 
+    it will convert it to a float64 matrix with one row per year and one column per indicator.
+    All the indicators of the country are requested concurrently.'''
+    return loadAllCountries([country_code], max_workers, per_host_limit, failures=failures)[0]
+
+
+#----------------------------------------------------------------------------------------------------
+# revisions
+# the "lastupdated" date of an indicator tells whether the stored values were revised (see store.refreshPanel)
+
+def getLastUpdated(indicators, country_code, per_host_limit=None):
+    '''
+    asks the API for the "lastupdated" date of each indicator with a one-row request
+
+    Returns
+    -------
+    lastUpdated : dict
+        indicator -> date, indicators whose request failed are left out.
+    '''
+    if per_host_limit is None:
+        per_host_limit=config.PER_HOST_LIMIT
+    first_year, last_year = getYearRange()
+    query=dict(config.params, date=str(last_year), per_page='1')
+    
+    def probe(indicator):
+        url=config.BASE_URL+'countries/'+country_code.lower()+'/indicators/'+indicator
+        # ttl=0: the answer must come from the server, not from the cache
+        return fetchPage(url, query, per_host_limit, ttl=0)
+    
+    with ThreadPoolExecutor(max_workers=min(len(indicators), per_host_limit) or 1) as pool:
+        pages=list(pool.map(probe, indicators))
+    return {indicator: page.meta['lastupdated'] for indicator, page in zip(indicators, pages)
+            if page.error is None and page.meta.get('lastupdated')}
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+rendering the charts: every chart is a declarative Chart drawn by renderCharts in a pool of
+processes on the non-interactive Agg backend, with figure templates and a render cache.
+
+seaborn and matplotlib are only imported when a chart is drawn.
+"""
+
+import os
+import shutil
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from . import config
+from .store import getDatasetVersion
+
+# a chart to draw: the kind of plot, its data, the file it is saved to and its settings.
+# plot holds the arguments of the plotting call, layout the settings of the axes
+# (plain_ticks, rotation, invert_y, xlabel, ylabel, legend)
+Chart=namedtuple('Chart', ['kind', 'data', 'path', 'title', 'figsize', 'style', 'plot', 'layout'])
+Chart.__new__.__defaults__=((7, 5), 'whitegrid', {}, {})
+
+
+#----------------------------------------------------------------------------------------------------
+# rendering the charts
+
+def drawChart(chart, ax):
+    '''
+    draws a Chart into the axes ax
+    '''
+    import seaborn as sns
+    if chart.kind == 'heatmap':
+        sns.heatmap(chart.data, ax=ax, **chart.plot)
+    elif chart.kind == 'line':
+        sns.lineplot(data=chart.data, ax=ax, **chart.plot)
+    elif chart.kind == 'scatter':
+        sns.scatterplot(data=chart.data, ax=ax, **chart.plot)
+    elif chart.kind == 'bar':
+        chart.data.plot(kind='bar', ax=ax, **chart.plot)
+    elif chart.kind == 'lines':
+        # one matplotlib line per column, against the index
+        for column in chart.plot['y']:
+            ax.plot(chart.data.index, chart.data[column], chart.plot.get('fmt', '-'))
+    else:
+        raise ValueError('unknown kind of chart: '+repr(chart.kind))
+    
+    ax.set_title(chart.title)
+    applyLayout(ax, chart.layout)
+
+
+def applyLayout(ax, layout):
+    '''
+    applies the layout settings of a Chart to the axes ax (shared by drawChart and buildTemplate)
+    '''
+    if layout.get('plain_ticks'):
+        ax.ticklabel_format(style='plain')
+    if 'rotation' in layout:
+        ax.tick_params(axis='x', labelrotation=layout['rotation'])
+    if layout.get('invert_y'):
+        ax.invert_yaxis()
+    if 'legend' in layout:
+        ax.legend(layout['legend'], loc='best')
+    if 'xlabel' in layout:
+        ax.set_xlabel(layout['xlabel'])
+    if 'ylabel' in layout:
+        ax.set_ylabel(layout['ylabel'])
+
+
+def renderChart(chart):
+    '''
+    draws a Chart in a new figure, saves it to chart.path and closes the figure
+
+    Returns
+    -------
+    path : str
+        the file written.
+    '''
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    # every chart starts from the same style, whatever was drawn before in this process
+    if chart.style is None:
+        sns.reset_orig()
+    else:
+        sns.set_theme(style=chart.style)
+    fig, ax = plt.subplots(figsize=chart.figsize)
+    try:
+        drawChart(chart, ax)
+        makeParentDirectory(chart.path)
+        fig.savefig(chart.path)
+    finally:
+        plt.close(fig)
+    return chart.path
+
+
+# figure templates
+# when the same chart is drawn for many countries, the figure, axes, lines, bars and legend are built
+# once for the first Chart and only their data, heights, tick labels and title change for the next ones
+
+# kinds of Chart which can be drawn from a template
+TEMPLATE_KINDS=('line', 'lines', 'bar')
+
+
+def canUseTemplate(chart):
+    '''
+    True when the Chart can be drawn from a template (a seaborn line plot split by hue cannot)
+    '''
+    return chart.kind in TEMPLATE_KINDS and not (chart.kind == 'line' and 'hue' in chart.plot)
+
+
+def getTemplateKey(chart):
+    '''
+    returns what the Charts sharing a template have in common: everything but the data, the file and the title
+    '''
+    return repr((chart.kind, chart.figsize, chart.style, sorted(chart.plot.items()), sorted(chart.layout.items())))
+
+
+def getBarPositions(n_groups, n_series):
+    '''
+    x position of the bars of every series of a grouped bar plot (like DataFrame.plot(kind='bar'))
+    '''
+    width=0.5/n_series
+    offsets=(np.arange(n_series)-(n_series-1)/2)*width
+    return np.arange(n_groups)[:, np.newaxis]+offsets[np.newaxis, :], width
+
+
+def getTemplateValues(chart):
+    '''
+    returns the x values and the list of y values of every artist of a templated Chart
+    '''
+    plot=chart.plot
+    if chart.kind == 'line':
+        # like seaborn, the missing points are left out and the line follows x
+        data=chart.data.dropna(subset=[plot['x'], plot['y']]).sort_values(plot['x'])
+        return data[plot['x']].to_numpy(), [data[plot['y']].to_numpy(dtype=float, na_value=np.nan)]
+    if chart.kind == 'lines':
+        return chart.data.index.to_numpy(), [chart.data[column].to_numpy(dtype=float, na_value=np.nan)
+                                             for column in plot['y']]
+    return chart.data[plot['x']].astype(str).to_numpy(), [chart.data[column].to_numpy(dtype=float, na_value=np.nan)
+                                                          for column in plot['y']]
+
+
+def buildTemplate(chart):
+    '''
+    draws the first Chart of a template with plain matplotlib artists
+
+    Returns
+    -------
+    template : dict
+        the figure, the axes and the artists (a Line2D per line, a list of bars per series).
+    '''
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    if chart.style is None:
+        sns.reset_orig()
+    else:
+        sns.set_theme(style=chart.style)
+    fig, ax = plt.subplots(figsize=chart.figsize)
+    plot=chart.plot
+    x, ys = getTemplateValues(chart)
+    if chart.kind == 'bar':
+        colors=plot.get('color') or [None]*len(ys)
+        positions, width = getBarPositions(len(x), len(ys))
+        artists=[ax.bar(positions[:, j], np.nan_to_num(y), width, color=colors[j], label=column)
+                 for j, (y, column) in enumerate(zip(ys, plot['y']))]
+        ax.set_xticks(np.arange(len(x)), x, rotation=90)
+        ax.set_xlabel(plot['x'])
+        ax.legend()
+    elif chart.kind == 'line':
+        artists=ax.plot(x, ys[0], linewidth=plot.get('linewidth'))
+        ax.set_xlabel(plot['x'])
+        ax.set_ylabel(plot['y'])
+    else:
+        artists=[ax.plot(x, y, plot.get('fmt', '-'))[0] for y in ys]
+    
+    applyLayout(ax, chart.layout)
+    return {'figure': fig, 'axes': ax, 'artists': artists, 'size': len(x)}
+
+
+def updateTemplate(template, chart):
+    '''
+    replaces the data of the template by the data of chart
+
+    Returns
+    -------
+    updated : bool
+        False when the chart does not fit the template (a different number of bars).
+    '''
+    ax=template['axes']
+    x, ys = getTemplateValues(chart)
+    if chart.kind == 'bar':
+        if len(x) != template['size']:
+            return False
+        for bars, y in zip(template['artists'], ys):
+            for bar, height in zip(bars, np.nan_to_num(y)):
+                bar.set_height(height)
+        ax.set_xticks(np.arange(len(x)), x, rotation=90)
+    else:
+        for line, y in zip(template['artists'], ys):
+            line.set_data(x, y)
+    ax.relim()
+    ax.autoscale_view()
+    return True
+
+
+def renderTemplated(charts):
+    '''
+    renders Charts sharing the same template key (e.g. the same chart for many countries), building
+    the figure once and only updating its data and title before saving each of them
+
+    Returns
+    -------
+    paths : list
+        the files written, in the order of charts.
+    '''
+    import matplotlib.pyplot as plt
+    if len(charts) == 1:
+        # nothing to reuse, draw it the usual way
+        return [renderChart(charts[0])]
+    template=None
+    paths=[]
+    try:
+        for chart in charts:
+            if not canUseTemplate(chart):
+                paths.append(renderChart(chart))
+                continue
+            if template is None or not updateTemplate(template, chart):
+                if template is not None:
+                    plt.close(template['figure'])
+                template=buildTemplate(chart)
+            template['axes'].set_title(chart.title)
+            makeParentDirectory(chart.path)
+            template['figure'].savefig(chart.path)
+            paths.append(chart.path)
+    finally:
+        if template is not None:
+            plt.close(template['figure'])
+    return paths
+
+
+def makeParentDirectory(path):
+    '''
+    creates the directory of path when it does not exist yet
+    '''
+    directory=os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+# render cache
+# every rendered image is also kept under the fingerprint of its Chart (its data and its settings),
+# a chart whose fingerprint is already in the cache is copied from there instead of being drawn again
+
+def getChartFingerprint(chart):
+    '''
+    returns a hash of the data and the settings of a Chart (the file it is saved to excluded),
+    and of the plotting library versions
+    '''
+    import matplotlib
+    import seaborn as sns
+    settings=repr((chart.kind, chart.title, chart.figsize, chart.style, sorted(chart.plot.items()),
+                   sorted(chart.layout.items()), matplotlib.__version__, sns.__version__))
+    return hashlib.sha1((getDatasetVersion(chart.data)+settings).encode()).hexdigest()
+
+
+def getCachedImage(chart):
+    '''
+    returns the path of the image of chart in the render cache
+    '''
+    return os.path.join(config.RENDER_CACHE_DIR, getChartFingerprint(chart)+os.path.splitext(chart.path)[1])
+
+
+def useHeadlessBackend():
+    '''
+    switches matplotlib to the Agg backend, which only draws into files (initializer of the render workers)
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def renderCharts(charts, max_workers=None, templated=None):
+    '''
+    renders the charts in a pool of processes on the Agg backend; the charts found in the render
+    cache (same data and settings) are copied from it instead
+
+    Parameters
+    ----------
+    charts : list
+        the Chart of every figure.
+    max_workers : int, optional
+        number of processes, defaults to RENDER_WORKERS; 1 renders in this process (switched to Agg).
+    templated : bool, optional
+        draw the Charts sharing a template key from one figure per process (see renderTemplated),
+        defaults to RENDER_TEMPLATES.
+
+    Returns
+    -------
+    paths : list
+        the files written, in the order of charts.
+    '''
+    if max_workers is None:
+        max_workers=config.RENDER_WORKERS
+    if templated is None:
+        templated=config.RENDER_TEMPLATES
+    paths=[chart.path for chart in charts]
+    
+    # the charts already rendered with the same data and settings are only copied
+    cachedImages=[getCachedImage(chart) for chart in charts] if config.RENDER_CACHE_ENABLED else [None]*len(charts)
+    toRender=[]
+    for i, (chart, cachedImage) in enumerate(zip(charts, cachedImages)):
+        if cachedImage is not None and os.path.exists(cachedImage):
+            makeParentDirectory(chart.path)
+            shutil.copyfile(cachedImage, chart.path)
+        else:
+            toRender.append(i)
+    if not toRender:
+        return paths
+    max_workers=max(1, min(max_workers, len(toRender)))
+    
+    # batches of charts rendered by one call: the charts of a template are split into one batch per
+    # process, every other chart is a batch of its own
+    groups={}
+    for i in toRender:
+        chart=charts[i]
+        key=getTemplateKey(chart) if templated and canUseTemplate(chart) else i
+        groups.setdefault(key, []).append(i)
+    batches=[]
+    for indexes in groups.values():
+        size=-(-len(indexes)//max_workers)
+        batches.extend(indexes[start:start+size] for start in range(0, len(indexes), size))
+    
+    chartBatches=[[charts[i] for i in batch] for batch in batches]
+    if max_workers == 1:
+        # in this process too, the charts are drawn on the Agg backend
+        useHeadlessBackend()
+        results=[renderTemplated(batch) for batch in chartBatches]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=useHeadlessBackend) as executor:
+            results=list(executor.map(renderTemplated, chartBatches))
+    for batch, batchPaths in zip(batches, results):
+        for i, path in zip(batch, batchPaths):
+            paths[i]=path
+            if cachedImages[i] is not None:
+                os.makedirs(config.RENDER_CACHE_DIR, exist_ok=True)
+                shutil.copyfile(path, cachedImages[i])
+    return paths
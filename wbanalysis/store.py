@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+the panel of all the countries indexed by (country, year): schema, building, incremental
+refresh, column selection and the Arrow snapshots.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+# pyarrow is optional, it is only used to save and reload the panel snapshots
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from . import config
+from .fetch import getLastUpdated, getYearRange, getYears, loadAllCountries, runFetchTasks
+
+#----------------------------------------------------------------------------------------------------
+# the panel
+# all the countries live in one DataFrame indexed by (country, year), with one float64 column per
+# indicator of featureMap. Every analysis reads from it instead of slicing and concatenating
+# one DataFrame per country.
+
+def buildSchema(float32_percentages=None, year_dtype=None):
+    '''
+    declarative dtypes of the panel and of the flat frames, derived from featureMap
+
+    Parameters
+    ----------
+    float32_percentages : bool, optional
+        store the percentage indicators (codes ending in .ZS) as float32, which halves their
+        memory; defaults to FLOAT32_PERCENTAGES.
+    year_dtype : str, optional
+        integer dtype of the years, e.g. 'Int16' (nullable) or 'int64'; defaults to YEAR_DTYPE.
+
+    Returns
+    -------
+    schema : dict
+        column name -> dtype, with the 'Year' and 'Country' entries.
+    '''
+    if float32_percentages is None:
+        float32_percentages=config.FLOAT32_PERCENTAGES
+    if year_dtype is None:
+        year_dtype=config.YEAR_DTYPE
+    
+    schema={}
+    for indicator, name in config.featureMap.items():
+        # the World Bank marks the indicators given as a percentage with the .ZS suffix
+        schema[name]='float32' if float32_percentages and indicator.endswith('.ZS') else 'float64'
+    schema['Year']=year_dtype
+    schema['Country']='category'
+    return schema
+
+
+def applySchema(df, schema=None):
+    '''
+    casts the columns of df to the dtypes of the schema in a single astype call;
+    the columns which already have the right dtype are not touched
+    '''
+    if schema is None:
+        schema=buildSchema()
+    casts={column: dtype for column, dtype in schema.items() if column in df.columns and df[column].dtype != dtype}
+    return df.astype(casts) if casts else df
+
+
+def buildPanel(country_codes, values, years=None, columns=None):
+    '''
+    wraps the block returned by loadAllCountries into the panel without copying the values
+
+    Parameters
+    ----------
+    country_codes : list
+        country codes in the order of the first axis of values.
+    values : numpy.ndarray
+        float64 block of shape (countries, years, indicators).
+    years : array, optional
+        the years of the second axis, defaults to getYears().
+    columns : list, optional
+        the indicator names of the third axis, defaults to the names of INDICATOR_CODES.
+
+    Returns
+    -------
+    panel : DataFrame
+        (country, year) MultiIndex with categorical country codes, one column per indicator.
+    '''
+    if years is None:
+        years=getYears()
+    if columns is None:
+        columns=[config.featureMap[indicator] for indicator in config.INDICATOR_CODES]
+    schema=buildSchema()
+    index=pd.MultiIndex.from_product(
+        [pd.CategoricalIndex(country_codes, categories=country_codes), pd.Index(years, dtype=schema['Year'])],
+        names=['country', 'year'])
+    # the block is contiguous, so the reshape is a view and the columns share its memory;
+    # only the columns the schema stores with another dtype are converted
+    panel=pd.DataFrame(values.reshape(len(country_codes)*len(years), len(columns)),
+                       index=index, columns=columns, copy=False)
+    return applySchema(panel, schema)
+
+
+def loadPanel(country_codes, max_workers=None, per_host_limit=None, batched=False, batch_size=None, failures=None):
+    '''
+    fetches all the indicators for the given countries and returns them as the panel,
+    the parameters are the ones of loadAllCountries. The "lastupdated" date of every
+    indicator is kept in panel.attrs['lastupdated'] for refreshPanel.
+    '''
+    lastUpdated={}
+    values=loadAllCountries(country_codes, max_workers, per_host_limit, batched, batch_size, failures, lastUpdated)
+    panel=buildPanel(country_codes, values)
+    panel.attrs['lastupdated']=lastUpdated
+    return panel
+
+
+#----------------------------------------------------------------------------------------------------
+# incremental refresh
+# instead of downloading the full history again, only the years after the last stored value of
+# every (country, indicator) are requested and written into the block of the panel
+
+def refreshPanel(panel, country_codes=None, last_year=None, check_revisions=False,
+                 max_workers=None, per_host_limit=None, batch_size=None, failures=None, ttl=None):
+    '''
+    brings a stored panel up to date by requesting, for every (country, indicator), only the
+    years after its last stored value. Countries missing from the panel get their full history.
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the stored panel, e.g. from loadSnapshot.
+    country_codes : list, optional
+        the countries wanted, defaults to the countries of the panel.
+    last_year : int, optional
+        the most recent year wanted, defaults to the last year of params['date'].
+    check_revisions : bool, optional
+        compare the "lastupdated" date of every indicator with the one stored in
+        panel.attrs['lastupdated'] and download the full history again when it changed.
+    max_workers, per_host_limit, batch_size, failures :
+        as for loadAllCountries, the requests are always batched.
+    ttl : float, optional
+        seconds the cached answers of the refresh requests are reused, defaults to REFRESH_TTL.
+        Older answers are revalidated with the server.
+
+    Returns
+    -------
+    panel : DataFrame
+        the refreshed panel.
+    '''
+    if batch_size is None:
+        batch_size=config.MAX_BATCH_COUNTRIES
+    
+    stored_codes=[str(code) for code in panel.index.get_level_values('country').unique()]
+    stored_years=panel.index.get_level_values('year').unique().to_numpy()
+    if country_codes is None:
+        country_codes=stored_codes
+    if last_year is None:
+        last_year=getYearRange()[1]
+    first_year=int(stored_years[0])
+    years=np.arange(first_year, max(last_year, int(stored_years[-1]))+1)
+    columns=list(panel.columns)
+    indicators=[getIndicatorCode(column) for column in columns]
+    
+    # the block of the refreshed panel, with the stored values copied in place
+    values=np.full((len(country_codes), len(years), len(columns)), np.nan)
+    stored=panel.to_numpy().reshape(len(stored_codes), len(stored_years), len(columns))
+    for i, country_code in enumerate(country_codes):
+        if country_code in stored_codes:
+            values[i, :len(stored_years), :]=stored[stored_codes.index(country_code)]
+    # the stored values are put back for the requests which fail
+    kept=values.copy()
+    
+    # revised indicators are downloaded again from the first year
+    lastUpdated=dict(panel.attrs.get('lastupdated', {}))
+    revised=set()
+    if check_revisions:
+        current=getLastUpdated(indicators, country_codes[0], per_host_limit)
+        for j, indicator in enumerate(indicators):
+            if indicator in current and current[indicator] != lastUpdated.get(indicator):
+                values[:, :, j]=np.nan
+                revised.add(indicator)
+    
+    # index of the first year to request for every (country, indicator): the one after the last stored value
+    observed=~np.isnan(values)
+    starts=np.where(observed.any(axis=1), len(years)-np.argmax(observed[:, ::-1, :], axis=1), 0)
+    
+    # countries starting from the same year are requested together
+    tasks=[]
+    for j, indicator in enumerate(indicators):
+        for start in np.unique(starts[:, j]):
+            if start >= len(years):
+                continue
+            codes=[country_codes[i] for i in np.flatnonzero(starts[:, j] == start)]
+            for k in range(0, len(codes), batch_size):
+                batch=codes[k:k+batch_size]
+                tasks.append((batch, indicator, (int(years[start]), int(years[-1])),
+                              {code: values[country_codes.index(code), start:, j] for code in batch}))
+    
+    # past the ttl the cached answers are revalidated with the server (a 304 costs no download)
+    if ttl is None:
+        ttl=config.REFRESH_TTL
+    fetched={}
+    refreshFailures=[]
+    runFetchTasks([task for task in tasks if task[1] not in revised], max_workers, per_host_limit, refreshFailures, fetched, ttl=ttl)
+    # ttl=0: the revised history must come from the server, not from an older cached answer
+    runFetchTasks([task for task in tasks if task[1] in revised], max_workers, per_host_limit, refreshFailures, fetched, ttl=0)
+    
+    # a failed request blanks its columns, keep the stored history instead
+    failed=set()
+    for failure in refreshFailures:
+        j=indicators.index(failure.indicator)
+        for code in failure.country.split(';'):
+            values[country_codes.index(code), :, j]=kept[country_codes.index(code), :, j]
+        failed.add(failure.indicator)
+    if failures is not None:
+        failures.extend(refreshFailures)
+    # the "lastupdated" date only describes the indicator once its whole history was downloaded,
+    # after fetching the recent years the stored date is kept so later revisions are still detected
+    for j, indicator in enumerate(indicators):
+        if indicator in fetched and indicator not in failed and (starts[:, j] == 0).all():
+            lastUpdated[indicator]=fetched[indicator]
+    
+    refreshed=buildPanel(country_codes, values, years, columns)
+    refreshed.attrs['lastupdated']=lastUpdated
+    return refreshed
+
+
+def selectColumns(panel, columns, country_codes=None):
+    '''
+    extracts some columns of the panel for some countries as a flat DataFrame with the
+    'Country' (name from countryMap) and 'Year' columns, the shape the plotting code uses
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel.
+    columns : list
+        indicator names, e.g. ['GDP in USD'].
+    country_codes : list, optional
+        countries in the order wanted, defaults to all the countries of the panel.
+
+    Returns
+    -------
+    df : DataFrame
+        the selected columns followed by 'Country' and 'Year'.
+    '''
+    if country_codes is None:
+        selected=panel[columns]
+    else:
+        selected=panel.loc[list(country_codes), columns]
+    df=selected.reset_index()
+    names=df['country'].astype(str).map(config.countryMap)
+    # categories in order of appearance, so the plots keep the order of country_codes
+    df['Country']=pd.Categorical(names, categories=names.unique())
+    df=df.rename(columns={'year': 'Year'})
+    return applySchema(df[list(columns)+['Country', 'Year']])
+
+#----------------------------------------------------------------------------------------------------
+# snapshots
+# the panel is saved as a directory of Arrow IPC (Feather v2) files: _index.arrow holds the
+# (country, year) index and every indicator has its own file, so a chart needing only 'GDP in USD'
+# memory-maps the index and that single file instead of reading the whole dataset.
+
+def getIndicatorCode(column):
+    '''
+    returns the indicator code of a panel column, e.g. 'NY.GDP.MKTP.CD' for 'GDP in USD'
+    '''
+    for indicator, name in config.featureMap.items():
+        if name == column:
+            return indicator
+    return column
+
+
+def writeArrowFile(table, path):
+    '''
+    writes an Arrow table to path, replacing the previous file only once the new one is complete
+    '''
+    with pa.OSFile(path+'.tmp', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path+'.tmp', path)
+
+
+def readArrowFile(path):
+    '''
+    memory-maps an Arrow IPC file, the columns of the returned table point into the mapped file
+    '''
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def saveSnapshot(panel, path):
+    '''
+    saves the panel as a snapshot directory, one file per indicator
+
+    Parameters
+    ----------
+    panel : DataFrame
+        the panel.
+    path : str
+        the snapshot directory, created if needed.
+
+    Returns
+    -------
+    None.
+    '''
+    if pa is None:
+        raise ImportError('pyarrow is needed to save snapshots')
+    os.makedirs(path, exist_ok=True)
+    
+    countries=panel.index.get_level_values('country')
+    index=pa.table({'country': pa.DictionaryArray.from_arrays(countries.codes.astype('int32'), list(countries.categories)),
+                    'year': pa.array(panel.index.get_level_values('year').to_numpy())})
+    writeArrowFile(index, os.path.join(path, '_index.arrow'))
+    
+    columns={}
+    for column in panel.columns:
+        indicator=getIndicatorCode(column)
+        writeArrowFile(pa.table({column: pa.array(panel[column].to_numpy())}), os.path.join(path, indicator+'.arrow'))
+        columns[column]=indicator
+    
+    # the "lastupdated" dates of the indicators, used by refreshPanel to detect revisions
+    with open(os.path.join(path, '_lastupdated.json'), 'w') as file:
+        json.dump(panel.attrs.get('lastupdated', {}), file, indent=1)
+    
+    # the list of columns, written last so an interrupted save does not look complete
+    with open(os.path.join(path, '_columns.json.tmp'), 'w') as file:
+        json.dump(columns, file, indent=1)
+    os.replace(os.path.join(path, '_columns.json.tmp'), os.path.join(path, '_columns.json'))
+
+
+def loadSnapshot(path, columns=None):
+    '''
+    reloads a panel saved by saveSnapshot, reading only the requested columns
+
+    Parameters
+    ----------
+    path : str
+        the snapshot directory.
+    columns : list, optional
+        the indicator names to read, e.g. ['GDP in USD'], defaults to all the saved columns.
+
+    Returns
+    -------
+    panel : DataFrame
+        the panel, with the values memory-mapped from the snapshot files.
+    '''
+    if pa is None:
+        raise ImportError('pyarrow is needed to load snapshots')
+    with open(os.path.join(path, '_columns.json')) as file:
+        saved=json.load(file)
+    if columns is None:
+        columns=list(saved)
+    
+    index=readArrowFile(os.path.join(path, '_index.arrow'))
+    countries=index.column('country').combine_chunks()
+    panelIndex=pd.MultiIndex.from_arrays(
+        [pd.Categorical.from_codes(countries.indices.to_numpy(), countries.dictionary.to_pylist()),
+         pd.Index(index.column('year').to_numpy(), dtype=buildSchema()['Year'])],
+        names=['country', 'year'])
+    
+    data={}
+    for column in columns:
+        table=readArrowFile(os.path.join(path, saved[column]+'.arrow'))
+        # float64 columns without nulls are converted without copying the mapped memory
+        data[column]=table.column(0).to_numpy()
+    panel=pd.DataFrame(data, index=panelIndex, columns=columns, copy=False)
+    
+    if os.path.exists(os.path.join(path, '_lastupdated.json')):
+        with open(os.path.join(path, '_lastupdated.json')) as file:
+            panel.attrs['lastupdated']=json.load(file)
+    return panel
+
+
+def hasSnapshot(path):
+    '''
+    True when a complete snapshot can be read from the directory path (pyarrow is installed and
+    _columns.json, written last by saveSnapshot, exists)
+    '''
+    return pa is not None and os.path.exists(os.path.join(path, '_columns.json'))
+
+
+#----------------------------------------------------------------------------------------------------
+# dataset version
+
+def getDatasetVersion(panel):
+    '''
+    returns a fingerprint of the content of the panel (index and values), which changes whenever
+    a refresh, a cleaning or a new selection changes the data
+    '''
+    hashes=pd.util.hash_pandas_object(panel, index=True).to_numpy()
+    return hashlib.sha1(hashes.tobytes()+'|'.join(map(str, panel.columns)).encode()).hexdigest()
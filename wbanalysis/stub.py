@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+local stand-in for the World Bank API, to exercise and benchmark the fetch path without network.
+
+    python -m wbanalysis.stub record --fixtures fixtures
+        saves the rows of the configured countries and indicators (and the catalog metadata) from
+        the real API into fixture files
+    python -m wbanalysis.stub serve --fixtures fixtures --latency 0.05 --error-rate 0.02 --rate-429 0.05
+        serves them (or made up values for the indicators without fixture) on http://127.0.0.1:8765/v2/
+
+Point the package at the stub with WB_BASE_URL=http://127.0.0.1:8765/v2/. The stub splits the
+answers into pages like the API (--max-page-size forces small pages), answers 503 and 429 (with
+Retry-After) at the given rates, supports ETag revalidation and counts the requests (and the
+largest number answered at the same time) at /stats.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from . import config
+from .fetch import fetchAllPages, getYearRange
+
+# answer of the API to an unknown indicator (with a status code 200)
+INVALID_VALUE=[{'message': [{'id': '120', 'key': 'Invalid value', 'value': 'The provided parameter value is not valid'}]}]
+
+
+#----------------------------------------------------------------------------------------------------
+# fixtures
+# one JSON file per indicator, {"lastupdated": ..., "rows": [observations as sent by the API]},
+# plus country.json and indicator.json holding the rows of the metadata endpoints
+
+def getFixturePath(fixtures, name):
+    '''
+    returns the file of the fixture name (an indicator code, 'country' or 'indicator')
+    '''
+    return os.path.join(fixtures, name+'.json')
+
+
+def recordFixtures(fixtures, indicators=None, country_codes=None, metadata=True, per_host_limit=None):
+    '''
+    downloads the rows of the indicators for the countries (over the years of params['date'])
+    from config.BASE_URL and saves them as fixtures
+
+    Parameters
+    ----------
+    fixtures : str
+        the fixtures directory, created if needed.
+    indicators : list, optional
+        indicator codes, defaults to config.INDICATOR_CODES.
+    country_codes : list, optional
+        country codes, defaults to the countries of config.countryMap.
+    metadata : bool, optional
+        also record the country and indicator metadata of the catalog. The default is True.
+
+    Returns
+    -------
+    failures : list
+        (name, error) of the fixtures which could not be recorded.
+    '''
+    if indicators is None:
+        indicators=config.INDICATOR_CODES
+    if country_codes is None:
+        country_codes=list(config.countryMap)
+    if per_host_limit is None:
+        per_host_limit=config.PER_HOST_LIMIT
+    os.makedirs(fixtures, exist_ok=True)
+    first_year, last_year = getYearRange()
+    query=dict(config.params, date=str(first_year)+':'+str(last_year))
+
+    requests=[(indicator, config.BASE_URL+'countries/'+';'.join(code.lower() for code in country_codes)+'/indicators/'+indicator,
+               query, len(country_codes)*(last_year-first_year+1)) for indicator in indicators]
+    if metadata:
+        requests+=[(name, config.BASE_URL+name, {'format': 'json'}, config.MAX_PAGE_SIZE) for name in ('country', 'indicator')]
+
+    failures=[]
+    for name, url, pageQuery, expected_rows in requests:
+        # ttl=0: record what the server answers now, not an older cached payload
+        pages=fetchAllPages(url, pageQuery, expected_rows, per_host_limit, ttl=0)
+        if pages[-1].error is not None:
+            failures.append((name, pages[-1].error))
+            continue
+        rows=[row for page in pages for row in page.rows]
+        with open(getFixturePath(fixtures, name), 'w') as file:
+            json.dump({'lastupdated': pages[0].meta.get('lastupdated'), 'rows': rows}, file)
+    return failures
+
+
+def loadFixtures(fixtures):
+    '''
+    reads every fixture of the directory
+
+    Returns
+    -------
+    loaded : dict
+        name -> {"lastupdated": ..., "rows": [...]}.
+    '''
+    loaded={}
+    if fixtures is None:
+        return loaded
+    for filename in sorted(os.listdir(fixtures)):
+        if filename.endswith('.json'):
+            with open(os.path.join(fixtures, filename)) as file:
+                loaded[filename[:-len('.json')]]=json.load(file)
+    return loaded
+
+
+def makeRows(country_codes, indicator, first_year, last_year):
+    '''
+    made up observations of an indicator without fixture: a value derived from a hash of
+    (country, indicator, year), so every run serves the same data, with about 1 value in 13 missing
+    '''
+    rows=[]
+    for code in country_codes:
+        for year in range(last_year, first_year-1, -1):
+            digest=int(hashlib.md5((code+indicator+str(year)).encode()).hexdigest(), 16)
+            rows.append({'indicator': {'id': indicator, 'value': config.featureMap.get(indicator, indicator)},
+                         'country': {'id': code, 'value': config.countryMap.get(code, code)},
+                         'countryiso3code': '', 'date': str(year),
+                         'value': None if digest % 13 == 0 else (digest % 100000)/10.0,
+                         'unit': '', 'obs_status': '', 'decimal': 1})
+    return rows
+
+
+#----------------------------------------------------------------------------------------------------
+# server
+
+class StubHandler(BaseHTTPRequestHandler):
+    '''
+    answers the requests of the package like the World Bank API v2
+    (settings and counters are kept on the server, see makeStubServer)
+    '''
+    protocol_version='HTTP/1.1'
+    # the headers and the body are separate writes, without this the delayed ACKs of the
+    # keep-alive connections add tens of milliseconds to every answer
+    disable_nagle_algorithm=True
+
+    def log_message(self, format, *args):
+        # keep the console quiet, the counters are at /stats
+        pass
+
+    def sendJSON(self, payload, status=200, headers=None):
+        body=json.dumps(payload).encode()
+        etag='"'+hashlib.md5(body).hexdigest()+'"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.sendEmpty(304, {'ETag': etag})
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendEmpty(self, status, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_GET(self):
+        server=self.server
+        url=urlsplit(self.path)
+        if url.path.strip('/') == 'stats':
+            with server.lock:
+                self.sendJSON(dict(server.stats))
+            return
+        # requests being answered at the same time, and their peak
+        with server.lock:
+            server.stats['in_flight']+=1
+            server.stats['max_in_flight']=max(server.stats['max_in_flight'], server.stats['in_flight'])
+        try:
+            self.answer(url)
+        finally:
+            with server.lock:
+                server.stats['in_flight']-=1
+
+    def answer(self, url):
+        server=self.server
+        query={name: values[0] for name, values in parse_qs(url.query).items()}
+        parts=[part for part in url.path.split('/') if part]
+        with server.lock:
+            server.stats['requests']+=1
+            draw=server.random.random()
+            latency=server.latency*(0.5+server.random.random()) if server.latency else 0
+        time.sleep(latency)
+        # 429 then 503 at their rates, the client is expected to retry
+        if draw < server.rate_429:
+            with server.lock:
+                server.stats['throttled']+=1
+            self.sendJSON(INVALID_VALUE, 429, {'Retry-After': str(server.retry_after)})
+            return
+        if draw < server.rate_429+server.error_rate:
+            with server.lock:
+                server.stats['errors']+=1
+            self.sendEmpty(503)
+            return
+
+        # /v2/country, /v2/indicator or /v2/countries/us;in/indicators/SP.POP.TOTL
+        if parts and parts[0] == 'v2':
+            parts=parts[1:]
+        if len(parts) == 1 and parts[0] in ('country', 'countries', 'indicator', 'indicators'):
+            name='country' if parts[0].startswith('countr') else 'indicator'
+            rows, lastUpdated = self.getMetadata(name), None
+        elif len(parts) == 4 and parts[0] in ('country', 'countries') and parts[2] in ('indicator', 'indicators'):
+            found=self.getObservations(parts[1].upper().split(';'), parts[3], query.get('date'))
+            if found is None:
+                self.sendJSON(INVALID_VALUE)
+                return
+            rows, lastUpdated = found
+        else:
+            self.sendJSON(INVALID_VALUE, 404)
+            return
+
+        # pages like the API, per_page (default 50) capped by the max page size of the stub
+        per_page=max(1, int(query.get('per_page', 50)))
+        if server.max_page_size:
+            per_page=min(per_page, server.max_page_size)
+        page=max(1, int(query.get('page', 1)))
+        meta={'page': page, 'pages': max(1, -(-len(rows)//per_page)), 'per_page': per_page, 'total': len(rows)}
+        if lastUpdated:
+            meta['lastupdated']=lastUpdated
+        self.sendJSON([meta, rows[(page-1)*per_page:page*per_page] or None])
+
+    def getMetadata(self, name):
+        '''
+        rows of the country or indicator endpoint, from the fixtures or from the configuration
+        '''
+        if name in self.server.fixtures:
+            return self.server.fixtures[name]['rows']
+        if name == 'country':
+            return [{'id': code, 'iso2Code': code, 'name': countryName, 'region': {'id': '', 'value': ''},
+                     'incomeLevel': {'id': '', 'value': ''}, 'lendingType': {'id': '', 'value': ''}, 'capitalCity': ''}
+                    for code, countryName in config.countryMap.items()]
+        return [{'id': code, 'name': indicatorName, 'unit': '', 'source': {'id': '2', 'value': 'World Development Indicators'},
+                 'topics': []} for code, indicatorName in config.featureMap.items()]
+
+    def getObservations(self, country_codes, indicator, date):
+        '''
+        rows and lastupdated date of an indicator for some countries and a date ('first:last' or a year),
+        None when the indicator has no fixture and made up values are disabled
+        '''
+        first_year, last_year = getYearRange()
+        if date:
+            first, _, last = date.partition(':')
+            first_year, last_year = int(first), int(last or first)
+        fixture=self.server.fixtures.get(indicator)
+        if fixture is None:
+            if not self.server.synthetic:
+                return None
+            return makeRows(country_codes, indicator, first_year, last_year), '2022-12-01'
+        wanted=set(country_codes)
+        rows=[row for row in fixture['rows']
+              if ('ALL' in wanted or row['country']['id'].upper() in wanted) and first_year <= int(row['date']) <= last_year]
+        return rows, fixture.get('lastupdated')
+
+
+def makeStubServer(port=8765, fixtures=None, latency=0.0, error_rate=0.0, rate_429=0.0, retry_after=1,
+                   max_page_size=None, synthetic=True, seed=0, host='127.0.0.1'):
+    '''
+    creates the stub server (call serve_forever, or use startStub for a background thread)
+
+    Parameters
+    ----------
+    port : int, optional
+        the port, 0 picks a free one. The default is 8765.
+    fixtures : str, optional
+        the fixtures directory written by recordFixtures.
+    latency : float, optional
+        mean seconds waited before each answer (uniformly between half and 1.5 times). The default is 0.
+    error_rate : float, optional
+        share of the requests answered 503. The default is 0.
+    rate_429 : float, optional
+        share of the requests answered 429 with a Retry-After header. The default is 0.
+    retry_after : int, optional
+        seconds of the Retry-After header. The default is 1.
+    max_page_size : int, optional
+        largest page served whatever per_page asks, to exercise the pagination.
+    synthetic : bool, optional
+        serve made up values for the indicators without fixture. The default is True.
+    seed : int, optional
+        seed of the random latencies and errors. The default is 0.
+    '''
+    server=ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads=True
+    server.fixtures=loadFixtures(fixtures)
+    server.latency=latency
+    server.error_rate=error_rate
+    server.rate_429=rate_429
+    server.retry_after=retry_after
+    server.max_page_size=max_page_size
+    server.synthetic=synthetic
+    server.random=random.Random(seed)
+    server.lock=threading.Lock()
+    server.stats={'requests': 0, 'errors': 0, 'throttled': 0, 'in_flight': 0, 'max_in_flight': 0}
+    return server
+
+
+def startStub(**settings):
+    '''
+    starts the stub server in a background thread, the settings are the ones of makeStubServer
+
+    Returns
+    -------
+    server : ThreadingHTTPServer
+        the running server; its base url is 'http://127.0.0.1:'+str(server.server_port)+'/v2/',
+        server.stats counts the requests and server.shutdown() stops it.
+    '''
+    server=makeStubServer(**settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    '''
+    command line of the stub: record or serve
+    '''
+    parser=argparse.ArgumentParser(prog='python -m wbanalysis.stub', description='local stub of the World Bank API')
+    parser.add_argument('command', choices=['record', 'serve'])
+    parser.add_argument('--fixtures', help='fixtures directory (required by record)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='mean seconds before each answer')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 503 answers')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='share of 429 answers')
+    parser.add_argument('--retry-after', type=int, default=1, help='seconds of the Retry-After header of the 429s')
+    parser.add_argument('--max-page-size', type=int, help='largest page served, to force the pagination')
+    parser.add_argument('--no-synthetic', action='store_true', help='reject the indicators without fixture')
+    parser.add_argument('--seed', type=int, default=0)
+    args=parser.parse_args(argv)
+
+    if args.command == 'record':
+        if not args.fixtures:
+            parser.error('record needs --fixtures')
+        for name, error in recordFixtures(args.fixtures):
+            print('could not record '+name+': '+str(error))
+        return
+
+    server=makeStubServer(args.port, args.fixtures, args.latency, args.error_rate, args.rate_429, args.retry_after,
+                          args.max_page_size, not args.no_synthetic, args.seed)
+    print('World Bank stub on http://127.0.0.1:'+str(server.server_port)+'/v2/ (stats at /stats)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()